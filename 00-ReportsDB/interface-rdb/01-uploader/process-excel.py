@@ -1,17 +1,54 @@
 import pandas as pd
+import numpy as np
 import os
 import glob
 import logging
 from datetime import datetime
 import re
+import argparse
+import hashlib
+import json
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time
+from openpyxl import load_workbook
 
 # Configure logging with timestamps
 logging.basicConfig(filename='process_excel.log', level=logging.INFO)
 
-def log_info(message):
+# ReportsDB connection used to look up the column projection
+DB_CONFIG = {
+    "host": "cmms-db-01",
+    "dbname": "ReportsDB",
+    "user": "postgres",
+    "password": "123456"
+}
+
+# Default number of rows held in memory per chunk by the streaming reader
+DEFAULT_CHUNK_SIZE = 5000
+
+# Manifest of converted workbooks, used to skip unchanged workbooks and sheets on rerun
+MANIFEST_FILE = 'process_excel_manifest.json'
+
+# Result of stream_sheet for a sheet without a header row: nothing is written, but the sheet
+# is recorded in the manifest (output_file None) so it is not reconverted on every run
+EMPTY_SHEET = "<empty sheet>"
+
+# XML namespaces of the xlsx workbook part
+SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIP_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+def timestamped(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    logging.info(f"{timestamp} - {message}")
-    print(f"{timestamp} - {message}")
+    return f"{timestamp} - {message}"
+
+def write_log(line):
+    logging.info(line)
+    print(line)
+
+def log_info(message):
+    write_log(timestamped(message))
 
 # Function to clean non-ASCII characters
 def clean_text(text):
@@ -19,6 +56,25 @@ def clean_text(text):
         return ''.join(char if ord(char) < 128 else '' for char in text)
     return text
 
+# Vectorized helpers: element-wise type tests on object columns
+_is_str = np.frompyfunc(lambda value: isinstance(value, str), 1, 1)
+_is_number = np.frompyfunc(lambda value: isinstance(value, (int, float)), 1, 1)
+
+# Function to clean non-ASCII characters column by column (same result as mapping clean_text)
+def clean_text_columns(df):
+    df = df.copy()
+    for position in range(df.shape[1]):
+        col = df.iloc[:, position]
+        # Only object columns can hold strings; numeric/date columns are left untouched
+        if col.dtype != object:
+            continue
+        is_str = _is_str(col.to_numpy()).astype(bool)
+        if not is_str.any():
+            continue
+        stripped = col.str.replace(r'[^\x00-\x7f]', '', regex=True)
+        df.isetitem(position, col.mask(is_str, stripped))
+    return df
+
 # Function to clean column names to be compatible with PostgreSQL and ensure lowercase
 def clean_column_name(col_name):
     # Replace invalid characters (like spaces, periods, and hyphens) with underscores
@@ -27,8 +83,10 @@ def clean_column_name(col_name):
     col_name = re.sub(r'_+', '_', col_name)
     return col_name[:63]  # Ensure no longer than 63 characters
 
-# Function to detect invalid values and log them to the ERRORS field
-def detect_errors_and_log(df):
+# Function to detect invalid values and log them to the ERRORS field (row by row).
+# Only used for frames without object columns, where iterrows() upcasts every value
+# to one common numpy dtype and the column-wise engine below cannot reproduce it.
+def detect_errors_and_log_rowwise(df):
     error_column_data = []
 
     for index, row in df.iterrows():
@@ -50,52 +108,503 @@ def detect_errors_and_log(df):
 
     return df
 
+# Function to compute the outlier mask of a single column with NumPy
+def outlier_mask(col):
+    if col.dtype == object:
+        # Mixed columns: only real numbers count, strings and dates are never outliers
+        values = col.to_numpy()
+        is_number = _is_number(values).astype(bool)
+        if not is_number.any():
+            return None
+        numbers = np.full(len(values), np.nan)
+        numbers[is_number] = values[is_number].astype(float)
+    elif pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        numbers = col.to_numpy(dtype=float, na_value=np.nan)
+    else:
+        return None
+
+    # NaN compares False on both sides, exactly like the scalar check
+    mask = (numbers > 1e10) | (numbers < -1e10)
+    return mask if mask.any() else None
+
+# Function to detect invalid values and log them to the ERRORS field
+def detect_errors_and_log(df):
+    if not (df.dtypes == object).any():
+        return detect_errors_and_log_rowwise(df)
+
+    # Duplicated column names yield a Series from row[col] in the row-wise check and
+    # are therefore never flagged there; skip them here as well
+    duplicated = df.columns.duplicated(keep=False)
+    error_logs = {}
+
+    for position, col in enumerate(df.columns):
+        if duplicated[position]:
+            continue
+        mask = outlier_mask(df.iloc[:, position])
+        if mask is None:
+            continue
+        # Build error strings only for the flagged rows (object values print like the row-wise check)
+        values = df.iloc[:, position].to_numpy(dtype=object)
+        for row_position in np.flatnonzero(mask):
+            error_logs.setdefault(row_position, []).append(f"{col}: {values[row_position]}")
+
+    # Combine all errors for the row, if any, into a semicolon-separated string
+    error_column_data = [None] * len(df)
+    for row_position, error_log in error_logs.items():
+        error_column_data[row_position] = '; '.join(error_log)
+
+    # Add the ERRORS column to the DataFrame
+    df['ERRORS'] = error_column_data
+
+    return df
+
 # Function to clean sheet names
 def clean_sheet_name(sheet_name):
     cleaned_name = re.sub(r'[^\w]', '_', sheet_name).strip('_')
     return re.sub(r'_+', '_', cleaned_name)
 
-# Set the pattern for the Excel files to process
-file_pattern = "EG*.xlsx"
-files_to_process = glob.glob(file_pattern)
+# Output file extension per output format
+OUTPUT_EXTENSIONS = {
+    "csv": "csv",
+    "parquet": "parquet"
+}
+
+# Function to build the output filename for a sheet
+def get_output_file_name(excel_file, sheet_name, output_format="csv"):
+    # Clean the sheet name
+    cleaned_sheet_name = clean_sheet_name(sheet_name)
+
+    # Generate the output filename
+    base_filename = os.path.splitext(os.path.basename(excel_file))[0]
+    return f"{base_filename}_{cleaned_sheet_name}_cleaned.{OUTPUT_EXTENSIONS[output_format]}"
+
+# Function to rename duplicated columns the way pd.read_csv does ('x', 'x.1', ...)
+def dedupe_column_names(columns):
+    deduped = []
+    seen = {}
+    for col in columns:
+        name = col
+        while name in seen:
+            seen[col] += 1
+            name = f"{col}.{seen[col]}"
+        seen.setdefault(name, 0)
+        deduped.append(name)
+    return deduped
+
+# Function to prepare a cleaned sheet for typed columnar output: numeric and date columns keep
+# their dtypes and nulls stay real nulls; only mixed (object) columns are turned into text
+def get_typed_frame(df):
+    df = df.copy()
+    df.columns = dedupe_column_names(df.columns)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+# Function to clean one sheet and save it to CSV (or Parquet); messages go through the given log function
+def convert_sheet(excel_file, sheet_name, df, log=log_info, output_format="csv"):
+    # Clean column names and ensure they are all lowercase with only one underscore between words
+    df.columns = [clean_column_name(col) for col in df.columns]
+
+    # Clean the data (remove non-ASCII characters)
+    df = clean_text_columns(df)
+
+    # Detect errors in the data and log to the ERRORS column
+    df = detect_errors_and_log(df)
+
+    if output_format == "parquet":
+        # Keep int/float/date dtypes and real nulls
+        df = get_typed_frame(df)
+    else:
+        # Cast all columns to strings to handle mixed types
+        df = df.astype(str)
+
+    # Add the original row number as 'original_line' column
+    df['original_line'] = df.index + 2  # Correcting row number offset
+
+    output_file = get_output_file_name(excel_file, sheet_name, output_format)
+
+    # Save the cleaned DataFrame
+    try:
+        if output_format == "parquet":
+            df.to_parquet(output_file, index=False)
+        else:
+            df.to_csv(output_file, index=False, encoding='utf-8')
+        log(f"Successfully saved {output_file}")
+        return output_file
+    except Exception as e:
+        log(f"Error saving {output_file}: {e}")
+        return None
+
+# Function to fetch the raw field names mapped by a mapping set, used as a column projection
+def get_projection_columns(set_name):
+    # Imported here so the converter itself runs without psycopg2 installed
+    import psycopg2
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT d.raw_field_name
+            FROM default_field_mappings d
+            JOIN mapping_sets s ON d.set_id = s.set_id
+            WHERE s.set_name = %s
+            UNION
+            SELECT f.raw_field_name
+            FROM field_mappings f
+            JOIN mapping_sets s ON f.set_id = s.set_id
+            WHERE s.set_name = %s
+        """, (set_name, set_name))
+        return {row[0] for row in cur.fetchall()}
+    finally:
+        cur.close()
+        conn.close()
+
+# Function to build cleaned column names from a header row, naming blanks and duplicates like pandas
+def get_stream_columns(header):
+    columns = []
+    seen = {}
+    for position, value in enumerate(header):
+        name = f"Unnamed: {position}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(clean_column_name(name))
+    return columns
 
-for excel_file in files_to_process:
-    log_info(f"Processing Excel file: {excel_file}")
+# Function to convert a cell value from openpyxl into what the CSV column should hold
+def get_stream_value(value):
+    if value is None:
+        return np.nan
+    # Dates are written the way pandas writes a date column: date only when there is no time part
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d") if value.time() == time(0) else str(value)
+    if isinstance(value, (date, time)):
+        return str(value)
+    return value
 
-    # Load the Excel file, read all sheets
+# Function to clean and append one chunk of rows to the CSV
+def write_stream_chunk(rows, columns, first_line, csv_file, first_chunk):
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    df = clean_text_columns(df)
+    df = detect_errors_and_log(df)
+    df = df.astype(str)
+    df['original_line'] = np.arange(first_line, first_line + len(df))
+    df.to_csv(csv_file, mode='w' if first_chunk else 'a', header=first_chunk, index=False, encoding='utf-8')
+
+# Function to stream one worksheet to CSV in fixed-size row chunks, optionally projecting columns
+def stream_sheet(excel_file, sheet_name, worksheet, chunk_size=DEFAULT_CHUNK_SIZE, projection=None, log=log_info):
+    csv_file = get_output_file_name(excel_file, sheet_name)
+    line = 2  # Header is line 1, matching the original_line offset of the pandas reader
     try:
-        df_dict = pd.read_excel(excel_file, sheet_name=None, engine='openpyxl')
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            log(f"Sheet {sheet_name} of {excel_file} is empty, skipping")
+            return EMPTY_SHEET
+
+        columns = get_stream_columns(header)
+        if projection is None:
+            positions = list(range(len(columns)))
+        else:
+            positions = [position for position, col in enumerate(columns) if col in projection]
+        columns = [columns[position] for position in positions]
+
+        chunk = []
+        chunk_start = line
+        first_chunk = True
+        for row in rows:
+            # Skip fully blank rows like pd.read_excel does
+            if all(value is None for value in row):
+                continue
+            values = [get_stream_value(row[position]) if position < len(row) else np.nan for position in positions]
+            chunk.append(values)
+            line += 1
+            if len(chunk) >= chunk_size:
+                write_stream_chunk(chunk, columns, chunk_start, csv_file, first_chunk)
+                chunk = []
+                chunk_start = line
+                first_chunk = False
+
+        if chunk or first_chunk:
+            write_stream_chunk(chunk, columns, chunk_start, csv_file, first_chunk)
+        log(f"Successfully saved {csv_file} ({line - 2} rows, {len(columns)} columns)")
+        return csv_file
+    except Exception as e:
+        log(f"Error saving {csv_file}: {e}")
+        return None
+
+# Function to hash a file's content without loading it all into memory
+def get_file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to fingerprint every sheet of a workbook from its xlsx parts, in workbook order.
+# A sheet's fingerprint covers its worksheet XML plus the workbook-wide shared strings and
+# styles it depends on, so it only changes when that sheet's converted output can change.
+def get_sheet_fingerprints(excel_file):
+    with zipfile.ZipFile(excel_file) as archive:
+        names = set(archive.namelist())
+        shared = hashlib.sha256()
+        for part in ('xl/sharedStrings.xml', 'xl/styles.xml'):
+            if part in names:
+                shared.update(archive.read(part))
+
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in relationships}
+
+        fingerprints = {}
+        for sheet in workbook.iter(f'{{{SPREADSHEET_NS}}}sheet'):
+            target = targets[sheet.get(f'{{{RELATIONSHIP_NS}}}id')]
+            part = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+            digest = shared.copy()
+            with archive.open(part) as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            fingerprints[sheet.get('name')] = digest.hexdigest()
+    return fingerprints
+
+def load_manifest(path=MANIFEST_FILE):
+    if not os.path.exists(path):
+        return {"workbooks": {}}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log_info(f"Could not read manifest {path}, rebuilding it: {e}")
+        return {"workbooks": {}}
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+# Function to describe the options that change the CSV output, so a change forces a rebuild
+def get_output_options(options):
+    projection = options["projection"]
+    return {
+        "format": options["format"],
+        "stream": options["stream"],
+        "projection": sorted(projection) if projection is not None else None
+    }
+
+# Function to decide which sheets of a workbook need converting.
+# Returns None when the workbook can be skipped entirely.
+def plan_workbook(excel_file, manifest, options, force=False):
+    entry = manifest["workbooks"].get(os.path.basename(excel_file))
+    file_hash = get_file_hash(excel_file)
+    output_options = get_output_options(options)
+    reusable = entry is not None and not force and entry.get("options") == output_options
+
+    def is_current(sheet_name, fingerprint):
+        sheet = entry["sheets"].get(sheet_name)
+        if sheet is None or sheet["hash"] != fingerprint:
+            return False
+        # Empty sheets have no output file to check
+        return sheet["output_file"] is None or os.path.exists(sheet["output_file"])
+
+    if reusable and entry["hash"] == file_hash and all(
+            is_current(sheet_name, fingerprint) for sheet_name, fingerprint in entry["fingerprints"].items()):
+        return None
+
+    fingerprints = get_sheet_fingerprints(excel_file)
+    sheet_names = [
+        sheet_name for sheet_name, fingerprint in fingerprints.items()
+        if not (reusable and is_current(sheet_name, fingerprint))
+    ]
+    return {
+        "excel_file": excel_file,
+        "hash": file_hash,
+        "fingerprints": fingerprints,
+        "sheet_names": sheet_names
+    }
+
+# Function to record a converted workbook in the manifest; failed sheets are left out so they are retried
+def record_workbook(manifest, plan, results, options):
+    key = os.path.basename(plan["excel_file"])
+    previous = manifest["workbooks"].get(key, {}).get("sheets", {})
+    sheets = {}
+    for sheet_name, fingerprint in plan["fingerprints"].items():
+        if sheet_name in plan["sheet_names"]:
+            output_file = results.get(sheet_name)
+            if output_file == EMPTY_SHEET:
+                sheets[sheet_name] = {"hash": fingerprint, "output_file": None}
+            elif output_file is not None:
+                sheets[sheet_name] = {"hash": fingerprint, "output_file": output_file}
+        elif sheet_name in previous:
+            sheets[sheet_name] = previous[sheet_name]
+    manifest["workbooks"][key] = {
+        "hash": plan["hash"],
+        "fingerprints": plan["fingerprints"],
+        "options": get_output_options(options),
+        "sheets": sheets,
+        "converted_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+# Function to convert the planned sheets of one workbook in the current process
+def convert_workbook(plan, options):
+    excel_file = plan["excel_file"]
+    sheet_names = plan["sheet_names"]
+    results = {}
+    log_info(f"Processing Excel file: {excel_file} ({len(sheet_names)} of {len(plan['fingerprints'])} sheets changed)")
+    if not sheet_names:
+        return results
+
+    if options["stream"]:
+        # Read-only mode parses rows lazily, so only one chunk per sheet is held in memory
+        try:
+            workbook = load_workbook(excel_file, read_only=True, data_only=True)
+        except Exception as e:
+            log_info(f"Error processing {excel_file}: {e}")
+            return results
+        try:
+            for sheet_name in sheet_names:
+                results[sheet_name] = stream_sheet(excel_file, sheet_name, workbook[sheet_name],
+                                                   options["chunk_size"], options["projection"])
+        finally:
+            workbook.close()
+        return results
+
+    # Load the Excel file, read the changed sheets
+    try:
+        df_dict = pd.read_excel(excel_file, sheet_name=sheet_names, engine='openpyxl')
     except Exception as e:
         log_info(f"Error processing {excel_file}: {e}")
-        continue
+        return results
 
     # Clean data and save to CSV for each sheet
     for sheet_name, df in df_dict.items():
-        # Clean column names and ensure they are all lowercase with only one underscore between words
-        df.columns = [clean_column_name(col) for col in df.columns]
+        results[sheet_name] = convert_sheet(excel_file, sheet_name, df, output_format=options["format"])
+    return results
 
-        # Clean the data (remove non-ASCII characters)
-        df = df.apply(lambda col: col.map(clean_text))
+# Worker task: read and convert a single sheet, returning its timestamped log lines and output file
+def convert_sheet_task(excel_file, sheet_name, options):
+    messages = []
+    log = lambda message: messages.append(timestamped(message))
+    output_file = None
+    try:
+        if options["stream"]:
+            workbook = load_workbook(excel_file, read_only=True, data_only=True)
+            try:
+                output_file = stream_sheet(excel_file, sheet_name, workbook[sheet_name],
+                                           options["chunk_size"], options["projection"], log)
+            finally:
+                workbook.close()
+        else:
+            df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
+            output_file = convert_sheet(excel_file, sheet_name, df, log, options["format"])
+    except Exception as e:
+        log(f"Error processing sheet {sheet_name} of {excel_file}: {e}")
+    return messages, output_file
 
-        # Detect errors in the data and log to the ERRORS column
-        df = detect_errors_and_log(df)
+# Function to convert workbooks, and the sheets inside each workbook, on a process pool.
+# Returns the output file written for each sheet, per workbook.
+def convert_workbooks_parallel(plans, workers, options):
+    results_by_file = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Submit every sheet up front so the pool stays busy across workbook boundaries
+        futures_by_file = {
+            plan["excel_file"]: [
+                (sheet_name, executor.submit(convert_sheet_task, plan["excel_file"], sheet_name, options))
+                for sheet_name in plan["sheet_names"]
+            ]
+            for plan in plans
+        }
 
-        # Cast all columns to strings to handle mixed types
-        df = df.astype(str)
+        # Merge the worker logs per file, in sheet order; a failed workbook does not stop the others
+        for plan in plans:
+            excel_file = plan["excel_file"]
+            log_info(f"Processing Excel file: {excel_file} "
+                     f"({len(plan['sheet_names'])} of {len(plan['fingerprints'])} sheets changed)")
+            results = results_by_file[excel_file] = {}
+            for sheet_name, future in futures_by_file[excel_file]:
+                try:
+                    messages, results[sheet_name] = future.result()
+                except Exception as e:
+                    messages = [timestamped(f"Error processing sheet {sheet_name} of {excel_file}: {e}")]
+                    results[sheet_name] = None
+                for line in messages:
+                    write_log(line)
+    return results_by_file
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert EG*.xlsx weekly reports to cleaned CSV files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (1 converts sequentially in this process)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream sheets with openpyxl read-only mode and write CSV in row chunks")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows per chunk in streaming mode")
+    parser.add_argument("--project", metavar="MAPPING_SET",
+                        help="Streaming mode only: keep just the columns mapped by this ReportsDB mapping set "
+                             "(e.g. 'Default Mapping')")
+    parser.add_argument("--format", choices=sorted(OUTPUT_EXTENSIONS), default="csv",
+                        help="Output format: csv (all text) or parquet (typed columns with real nulls, needs pyarrow)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reconvert every workbook and sheet, ignoring the manifest")
+    args = parser.parse_args()
+    if args.stream and args.format != "csv":
+        parser.error("--stream only writes CSV; use the default reader for --format parquet")
+    return args
 
-        # Add the original row number as 'original_line' column
-        df['original_line'] = df.index + 2  # Correcting row number offset
+def main():
+    args = parse_args()
 
-        # Clean the sheet name
-        cleaned_sheet_name = clean_sheet_name(sheet_name)
+    # Set the pattern for the Excel files to process
+    file_pattern = "EG*.xlsx"
+    files_to_process = glob.glob(file_pattern)
 
-        # Generate the output CSV filename
-        base_filename = os.path.splitext(os.path.basename(excel_file))[0]
-        csv_file = f"{base_filename}_{cleaned_sheet_name}_cleaned.csv"
+    projection = None
+    if args.project:
+        if not args.stream:
+            log_info("--project requires --stream, ignoring the projection")
+        else:
+            projection = get_projection_columns(args.project)
+            log_info(f"Projecting {len(projection)} columns from mapping set '{args.project}'")
+
+    options = {
+        "format": args.format,
+        "stream": args.stream,
+        "chunk_size": args.chunk_size,
+        "projection": projection
+    }
 
-        # Save the cleaned DataFrame to CSV
+    # Work out which workbooks and sheets changed since the last run
+    manifest = load_manifest()
+    plans = []
+    skipped = 0
+    for excel_file in files_to_process:
         try:
-            df.to_csv(csv_file, index=False, encoding='utf-8')
-            log_info(f"Successfully saved {csv_file}")
+            plan = plan_workbook(excel_file, manifest, options, args.force)
         except Exception as e:
-            log_info(f"Error saving {csv_file}: {e}")
+            log_info(f"Error processing {excel_file}: {e}")
+            continue
+        if plan is None:
+            log_info(f"Skipping unchanged Excel file: {excel_file}")
+            skipped += 1
+            continue
+        plans.append(plan)
+
+    if args.workers > 1:
+        results_by_file = convert_workbooks_parallel(plans, args.workers, options)
+        for plan in plans:
+            record_workbook(manifest, plan, results_by_file[plan["excel_file"]], options)
+        save_manifest(manifest)
+    else:
+        for plan in plans:
+            results = convert_workbook(plan, options)
+            record_workbook(manifest, plan, results, options)
+            save_manifest(manifest)
+
+    log_info(f"Converted {len(plans)} workbook(s), skipped {skipped} unchanged workbook(s)")
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,31 @@ import glob
 import logging
 from datetime import datetime
 import re
+import io
+import codecs
+import argparse
+import itertools
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Configure logging with timestamps
 logging.basicConfig(filename='upload_reports.log', level=logging.INFO)
 
+# Default number of rows encoded and sent per COPY chunk
+DEFAULT_CHUNK_SIZE = 5000
+
+# ReportsDB connection settings
+DB_CONFIG = {
+    "host": "cmms-db-01",
+    "dbname": "ReportsDB",
+    "user": "postgres",
+    "password": "123456"
+}
+
+# Connection held by each upload worker process (see init_upload_worker)
+worker_conn = None
+
 def log_info(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     logging.info(f"{timestamp} - {message}")
@@ -31,74 +52,338 @@ def extract_report_date(file_name):
             return None
     return None
 
-# Connect to PostgreSQL database
-conn = psycopg2.connect(
-    host="cmms-db-01",
-    dbname="ReportsDB",
-    user="postgres",
-    password="123456"
-)
-cur = conn.cursor()
+# Function to read a cleaned sheet written by process-excel.py (CSV text or typed Parquet)
+def read_report_file(file_path):
+    if file_path.endswith('.parquet'):
+        try:
+            return pd.read_parquet(file_path)
+        except Exception as e:
+            log_info(f"Error reading {file_path}: {e}")
+            return None
 
-# Pattern to match preprocessed CSV files
-file_pattern = "*.csv"
-files_to_process = glob.glob(file_pattern)
+    try:
+        return pd.read_csv(file_path, dtype=str, encoding='utf-8')
+    except UnicodeDecodeError:
+        log_info(f"UTF-8 decoding failed for {file_path}, trying latin-1")
+        try:
+            return pd.read_csv(file_path, dtype=str, encoding='latin-1')
+        except Exception as e:
+            log_info(f"Error reading {file_path}: {e}")
+            return None
 
-for file_path in files_to_process:
-    log_info(f"Processing CSV file: {file_path}")
+# Function to compute the content checksum of an uploaded file without loading it into memory
+def get_file_checksum(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-    # Extract the report name (original Excel file name from the CSV name)
-    report_name = os.path.basename(file_path).split('_')[0]  # Extract just the report name
+# Function to decide how a sheet should be uploaded, based on its latest uploaded version.
+# Returns the version to insert, or None when the latest version has the same checksum.
+def get_upload_version(cur, report_name, report_date, sheet_name, checksum):
+    # Serialize uploads of the same sheet until this transaction ends
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{report_name}|{report_date}|{sheet_name}",))
+    cur.execute(
+        """
+        SELECT version, content_checksum
+        FROM raw_egypt_weekly_reports
+        WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+        ORDER BY version DESC
+        LIMIT 1
+        """,
+        (report_name, report_date, sheet_name)
+    )
+    latest = cur.fetchone()
+    if latest is None:
+        return 1
+    version, latest_checksum = latest
+    if latest_checksum == checksum:
+        return None
+    return version + 1
 
-    # Extract the report date from the file name
-    report_date = extract_report_date(os.path.basename(file_path))
-    if report_date is None:
-        log_info(f"Error extracting report date from {file_path}")
-        continue
+# Function to retire the older versions of a sheet when a new version is uploaded, in the same transaction.
+# Their unexported preprocessed rows (and quality checks, errors and checkpoints) are removed so the new
+# version replaces them; returns the raw_data_ids that were superseded.
+def supersede_older_versions(cur, report_name, report_date, sheet_name, version):
+    cur.execute(
+        """
+        UPDATE raw_egypt_weekly_reports
+        SET superseded = TRUE
+        WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+          AND version < %s AND NOT superseded
+        RETURNING raw_data_id
+        """,
+        (report_name, report_date, sheet_name, version)
+    )
+    raw_data_ids = [row[0] for row in cur.fetchall()]
+    if not raw_data_ids:
+        return raw_data_ids
 
-    # Extract the sheet name from the file name, removing "cleaned" and problematic characters
-    sheet_name = os.path.basename(file_path).replace('.csv', '').replace('cleaned', '')
-    cleaned_sheet_name = clean_sheet_name(sheet_name)
+    cur.execute(
+        """
+        DELETE FROM quality_checked_records q
+        USING preprocessed_egypt_weekly_data p
+        WHERE q.preprocessed_id = p.preprocessed_id AND p.raw_data_id = ANY(%s)
+        """,
+        (raw_data_ids,)
+    )
+    for table in ("preprocessed_egypt_weekly_data", "preprocessing_errors", "preprocessing_progress"):
+        cur.execute(f"DELETE FROM {table} WHERE raw_data_id = ANY(%s)", (raw_data_ids,))
+    return raw_data_ids
 
-    # Read the CSV file into a DataFrame
+# Function to find the encoding of a CSV file without loading it: UTF-8 if it decodes, otherwise latin-1
+def get_csv_encoding(file_path):
+    decoder = codecs.getincrementaldecoder('utf-8')()
     try:
-        df = pd.read_csv(file_path, dtype=str, encoding='utf-8')
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        return 'utf-8'
     except UnicodeDecodeError:
         log_info(f"UTF-8 decoding failed for {file_path}, trying latin-1")
-        try:
-            df = pd.read_csv(file_path, dtype=str, encoding='latin-1')
-        except Exception as e:
-            log_info(f"Error reading {file_path}: {e}")
-            continue
+        return 'latin-1'
+
+# Function to read a cleaned sheet in DataFrame chunks of chunk_size rows
+def iter_report_chunks(file_path, chunk_size):
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+
+    encoding = get_csv_encoding(file_path)
+    yield from pd.read_csv(file_path, dtype=str, encoding=encoding, chunksize=chunk_size)
+
+# File-like object that feeds COPY ... FROM STDIN one encoded chunk at a time, so only one
+# chunk of rows is ever held in memory. Each row becomes (raw_data_id, original_line, row_data).
+class RowCopyStream:
+    def __init__(self, raw_data_id, chunks):
+        self.raw_data_id = raw_data_id
+        self.chunks = chunks
+        self.buffer = io.StringIO()
+        self.row_count = 0
+
+    def encode_chunk(self, df):
+        lines = []
+        for row_json in df.to_json(orient="records", lines=True, date_format="iso").splitlines():
+            self.row_count += 1
+            # COPY CSV format: quote the JSON and double any embedded quotes
+            row_json = row_json.replace('"', '""')
+            lines.append(f'{self.raw_data_id},{self.row_count},"{row_json}"\n')
+        return ''.join(lines)
+
+    def read(self, size=-1):
+        data = self.buffer.read(size)
+        while not data:
+            df = next(self.chunks, None)
+            if df is None:
+                return ''
+            self.buffer = io.StringIO(self.encode_chunk(df))
+            data = self.buffer.read(size)
+        return data
+
+# Function to upload a sheet as one JSONB document in raw_egypt_weekly_reports.row_data
+def upload_blob(cur, file_path, report_name, report_date, sheet_name, checksum, version):
+    # Read the file into a DataFrame
+    df = read_report_file(file_path)
+    if df is None:
+        return None
 
     # Get the column names as a list
     column_names = df.columns.tolist()
 
-    # Convert the entire DataFrame to JSON (this will be a JSON representation of all rows)
-    sheet_data_json = df.to_json(orient="records")
+    # Convert the entire DataFrame to JSON (this will be a JSON representation of all rows).
+    # Typed Parquet input keeps numbers as JSON numbers, nulls as null and dates as ISO strings.
+    sheet_data_json = df.to_json(orient="records", date_format="iso")
 
     # Insert a single record with all the sheet's data into the raw_egypt_weekly_reports table
-    try:
-        cur.execute(
-            """
-            INSERT INTO raw_egypt_weekly_reports (report_name, report_date, sheet_name, column_names, row_data)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (
-                report_name,                       # report_name (original Excel file name)
-                report_date,                       # report_date (extracted date)
-                cleaned_sheet_name,                # sheet_name (cleaned)
-                column_names,                      # column_names as TEXT[]
-                sheet_data_json                    # row_data (entire sheet's data as a JSON string)
-            )
+    cur.execute(
+        """
+        INSERT INTO raw_egypt_weekly_reports
+        (report_name, report_date, sheet_name, column_names, row_data, content_checksum, version)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        (
+            report_name,                       # report_name (original Excel file name)
+            report_date,                       # report_date (extracted date)
+            sheet_name,                        # sheet_name (cleaned)
+            column_names,                      # column_names as TEXT[]
+            sheet_data_json,                   # row_data (entire sheet's data as a JSON string)
+            checksum,                          # content_checksum (SHA-256 of the uploaded file)
+            version                            # version of this sheet
         )
+    )
+    return len(df)
+
+# Function to upload a sheet row by row into raw_egypt_weekly_report_rows with COPY FROM STDIN
+def upload_rows(cur, file_path, report_name, report_date, sheet_name, checksum, version,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    chunks = iter_report_chunks(file_path, chunk_size)
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        log_info(f"No rows found in {file_path}")
+        return None
+
+    # Header record: column names only, the rows go to the row-level table
+    cur.execute(
+        """
+        INSERT INTO raw_egypt_weekly_reports
+        (report_name, report_date, sheet_name, column_names, content_checksum, version)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING raw_data_id
+        """,
+        (report_name, report_date, sheet_name, first_chunk.columns.tolist(), checksum, version)
+    )
+    raw_data_id = cur.fetchone()[0]
+
+    stream = RowCopyStream(raw_data_id, itertools.chain([first_chunk], chunks))
+    cur.copy_expert(
+        """
+        COPY raw_egypt_weekly_report_rows (raw_data_id, original_line, row_data)
+        FROM STDIN WITH (FORMAT csv)
+        """,
+        stream
+    )
+    return stream.row_count
+
+# Function to upload one cleaned sheet file in its own transaction.
+# Returns the status ('inserted', 'new_version', 'skipped' or 'failed') and the number of rows uploaded.
+def upload_file(conn, file_path, storage="rows", chunk_size=DEFAULT_CHUNK_SIZE):
+    log_info(f"Processing report file: {file_path}")
+
+    # Extract the report name (original Excel file name from the CSV name)
+    report_name = os.path.basename(file_path).split('_')[0]  # Extract just the report name
+
+    # Extract the report date from the file name
+    report_date = extract_report_date(os.path.basename(file_path))
+    if report_date is None:
+        log_info(f"Error extracting report date from {file_path}")
+        return 'failed', 0
+
+    # Extract the sheet name from the file name, removing "cleaned" and problematic characters
+    sheet_name = os.path.splitext(os.path.basename(file_path))[0].replace('cleaned', '')
+    cleaned_sheet_name = clean_sheet_name(sheet_name)
+
+    cur = conn.cursor()
+    try:
+        checksum = get_file_checksum(file_path)
+        version = get_upload_version(cur, report_name, report_date, cleaned_sheet_name, checksum)
+        if version is None:
+            conn.rollback()
+            log_info(f"Skipping unchanged sheet {cleaned_sheet_name} from report {report_name}")
+            return 'skipped', 0
+
+        if storage == "rows":
+            row_count = upload_rows(cur, file_path, report_name, report_date, cleaned_sheet_name,
+                                    checksum, version, chunk_size)
+        else:
+            row_count = upload_blob(cur, file_path, report_name, report_date, cleaned_sheet_name,
+                                    checksum, version)
+        if row_count is None:
+            conn.rollback()
+            return 'failed', 0
+        superseded = supersede_older_versions(cur, report_name, report_date, cleaned_sheet_name, version)
+        if superseded:
+            log_info(f"Superseded earlier version(s) of {cleaned_sheet_name} (IDs: {superseded})")
         conn.commit()
-        log_info(f"Successfully inserted sheet {cleaned_sheet_name} from report {report_name} into raw_egypt_weekly_reports")
+        log_info(f"Successfully inserted sheet {cleaned_sheet_name} from report {report_name} "
+                 f"(version {version}, {row_count} rows) into raw_egypt_weekly_reports")
+        return ('inserted' if version == 1 else 'new_version'), row_count
 
     except Exception as e:
         log_info(f"Error inserting data for {cleaned_sheet_name} in {report_name}: {e}")
         conn.rollback()
+        return 'failed', 0
+    finally:
+        cur.close()
+
+# Worker process initializer: each worker keeps one connection for all the files it uploads,
+# so the pool of workers doubles as a small connection pool
+def init_upload_worker():
+    global worker_conn
+    worker_conn = psycopg2.connect(**DB_CONFIG)
+
+# Worker task: read, encode and upload one file over the worker's connection
+def upload_file_task(file_path, storage, chunk_size):
+    return upload_file(worker_conn, file_path, storage, chunk_size)
+
+# Function to list the cleaned sheet files to upload, one file per sheet: when a sheet was
+# converted to both formats, the Parquet file is used and the CSV is left out
+def get_report_files():
+    parquet_files = glob.glob("*.parquet")
+    parquet_stems = {os.path.splitext(file_path)[0] for file_path in parquet_files}
+    csv_files = [file_path for file_path in glob.glob("*.csv")
+                 if os.path.splitext(file_path)[0] not in parquet_stems]
+    return csv_files + parquet_files
+
+# Function to log progress and throughput after each finished file
+def log_progress(done, total, file_path, status, row_count, totals, start_time):
+    elapsed = max(time.perf_counter() - start_time, 1e-6)
+    log_info(f"[{done}/{total}] {os.path.basename(file_path)}: {status}, {row_count} rows | "
+             f"total {totals['rows']} rows, {totals['bytes'] / 1048576:.1f} MB in {elapsed:.1f}s "
+             f"({totals['rows'] / elapsed:.0f} rows/s, {totals['bytes'] / 1048576 / elapsed:.2f} MB/s)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Upload cleaned report sheets into ReportsDB")
+    parser.add_argument("--storage", choices=["rows", "blob"], default="rows",
+                        help="rows: one row per report line in raw_egypt_weekly_report_rows, loaded with COPY; "
+                             "blob: the whole sheet as one JSONB value in raw_egypt_weekly_reports.row_data")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows encoded and sent per COPY chunk (rows storage)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of upload worker processes, each with its own connection "
+                             "(1 uploads sequentially over a single connection)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # Preprocessed CSV and Parquet files, one per sheet
+    files_to_process = get_report_files()
+
+    summary = {'inserted': 0, 'new_version': 0, 'skipped': 0, 'failed': 0}
+    totals = {'rows': 0, 'bytes': 0}
+    start_time = time.perf_counter()
+
+    def record(done, file_path, status, row_count):
+        summary[status] += 1
+        totals['rows'] += row_count
+        if status in ('inserted', 'new_version'):
+            totals['bytes'] += os.path.getsize(file_path)
+        log_progress(done, len(files_to_process), file_path, status, row_count, totals, start_time)
+
+    if args.workers > 1:
+        # Each file is read, encoded and uploaded in its own transaction on a worker process
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_upload_worker) as executor:
+            futures = {
+                executor.submit(upload_file_task, file_path, args.storage, args.chunk_size): file_path
+                for file_path in files_to_process
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                try:
+                    status, row_count = future.result()
+                except Exception as e:
+                    log_info(f"Error uploading {file_path}: {e}")
+                    status, row_count = 'failed', 0
+                record(done, file_path, status, row_count)
+    else:
+        # Connect to PostgreSQL database
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            for done, file_path in enumerate(files_to_process, 1):
+                status, row_count = upload_file(conn, file_path, args.storage, args.chunk_size)
+                record(done, file_path, status, row_count)
+        finally:
+            # Close the connection
+            conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    log_info(f"Upload summary: {summary['inserted']} new sheets, {summary['new_version']} new versions, "
+             f"{summary['skipped']} unchanged sheets skipped, {summary['failed']} failed "
+             f"({totals['rows']} rows in {elapsed:.1f}s)")
 
-# Close the cursor and connection
-cur.close()
-conn.close()
+if __name__ == "__main__":
+    main()
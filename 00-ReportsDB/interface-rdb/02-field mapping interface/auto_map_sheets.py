@@ -0,0 +1,168 @@
+# auto_map_sheets.py
+#
+# Headless counterpart of the field mapping tool for the weekly routine: every uploaded sheet
+# without field mappings is matched against the column layouts of already mapped sheets.
+#   - same columns as a mapped sheet: its mappings are copied (one INSERT for all such sheets)
+#   - close to a mapped sheet (--min-similarity): queued in mapping_review_queue
+#   - otherwise: left for manual mapping in main.py
+
+import argparse
+import hashlib
+import psycopg2
+from psycopg2.extras import execute_values
+
+DB_CONFIG = {
+    "dbname": "ReportsDB",
+    "user": "postgres",
+    "password": "123456",
+    "host": "cmms-db-01",
+    "port": "5432"
+}
+
+DEFAULT_MIN_SIMILARITY = 0.8
+
+def normalize_columns(column_names):
+    """The set of column names of a sheet, as the field mappings match them (quotes and padding stripped)."""
+    return frozenset(str(name).strip('"').strip() for name in column_names or [] if str(name).strip())
+
+def layout_fingerprint(columns):
+    return hashlib.md5("\x1f".join(sorted(columns)).encode("utf-8")).hexdigest()
+
+def get_pending_sheets(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT r.raw_data_id, r.report_name, r.report_date, r.sheet_name, r.column_names
+            FROM raw_egypt_weekly_reports r
+            WHERE NOT r.preprocessed AND NOT r.superseded
+              AND NOT EXISTS (SELECT 1 FROM field_mappings f WHERE f.raw_data_id = r.raw_data_id)
+            ORDER BY r.report_date, r.raw_data_id
+        """)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def get_mapped_layouts(conn):
+    """Returns {fingerprint: (raw_data_id, columns)}, keeping the most recent mapped sheet per layout."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT r.raw_data_id, r.column_names
+            FROM raw_egypt_weekly_reports r
+            WHERE EXISTS (SELECT 1 FROM field_mappings f WHERE f.raw_data_id = r.raw_data_id)
+            ORDER BY r.report_date, r.raw_data_id
+        """)
+        layouts = {}
+        for raw_data_id, column_names in cursor.fetchall():
+            columns = normalize_columns(column_names)
+            if columns:
+                layouts[layout_fingerprint(columns)] = (raw_data_id, columns)
+        return layouts
+    finally:
+        cursor.close()
+
+def find_closest_layout(columns, layouts):
+    """Returns (similarity, raw_data_id, columns) of the mapped layout with the highest Jaccard similarity."""
+    best = (0.0, None, frozenset())
+    for raw_data_id, layout_columns in layouts.values():
+        similarity = len(columns & layout_columns) / len(columns | layout_columns)
+        if similarity > best[0]:
+            best = (similarity, raw_data_id, layout_columns)
+    return best
+
+def copy_mappings(cursor, pairs):
+    """Copies the field mappings of each source sheet to its target sheet in one statement."""
+    execute_values(cursor, """
+        INSERT INTO field_mappings (raw_data_id, raw_field_name, mapping_type, target_field_name, set_id, data_type)
+        SELECT t.target_id, f.raw_field_name, f.mapping_type, f.target_field_name, f.set_id, f.data_type
+        FROM (VALUES %s) AS t(target_id, source_id)
+        JOIN field_mappings f ON f.raw_data_id = t.source_id
+        ON CONFLICT (raw_data_id, raw_field_name) DO NOTHING
+    """, pairs, page_size=len(pairs))
+    return cursor.rowcount
+
+def queue_for_review(cursor, reviews):
+    execute_values(cursor, """
+        INSERT INTO mapping_review_queue
+            (raw_data_id, candidate_raw_data_id, similarity, missing_columns, extra_columns)
+        VALUES %s
+        ON CONFLICT (raw_data_id) DO UPDATE SET
+            candidate_raw_data_id = EXCLUDED.candidate_raw_data_id,
+            similarity = EXCLUDED.similarity,
+            missing_columns = EXCLUDED.missing_columns,
+            extra_columns = EXCLUDED.extra_columns,
+            queued_at = CURRENT_TIMESTAMP
+    """, reviews, page_size=len(reviews))
+
+def auto_map(conn, min_similarity=DEFAULT_MIN_SIMILARITY, dry_run=False):
+    pending = get_pending_sheets(conn)
+    if not pending:
+        print("No sheets waiting for field mappings.")
+        return
+
+    layouts = get_mapped_layouts(conn)
+    print(f"{len(pending)} unmapped sheets, {len(layouts)} mapped layouts")
+
+    exact = []    # (target raw_data_id, source raw_data_id)
+    reviews = []  # mapping_review_queue rows
+    unmatched = []
+    for raw_data_id, report_name, report_date, sheet_name, column_names in pending:
+        label = f"{report_name} - {report_date} - {sheet_name} (ID: {raw_data_id})"
+        columns = normalize_columns(column_names)
+        if not columns:
+            unmatched.append(label)
+            continue
+
+        layout = layouts.get(layout_fingerprint(columns))
+        if layout:
+            exact.append((raw_data_id, layout[0]))
+            print(f"Exact layout match: {label} <- ID {layout[0]}")
+            continue
+
+        similarity, candidate_id, candidate_columns = find_closest_layout(columns, layouts)
+        if candidate_id is not None and similarity >= min_similarity:
+            reviews.append((raw_data_id, candidate_id, round(similarity, 4),
+                            sorted(candidate_columns - columns), sorted(columns - candidate_columns)))
+            print(f"Near match ({similarity:.0%}), queued for review: {label} ~ ID {candidate_id}")
+        else:
+            unmatched.append(label)
+
+    for label in unmatched:
+        print(f"No matching layout: {label}")
+
+    if dry_run:
+        print(f"Dry run: {len(exact)} sheets would be mapped, {len(reviews)} queued for review, {len(unmatched)} unmatched")
+        return
+
+    cursor = conn.cursor()
+    try:
+        copied = copy_mappings(cursor, exact) if exact else 0
+        if reviews:
+            queue_for_review(cursor, reviews)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    print(f"Mapped {len(exact)} sheets ({copied} field mappings copied), "
+          f"{len(reviews)} queued for review, {len(unmatched)} unmatched")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Copy field mappings to unmapped sheets with a known column layout")
+    parser.add_argument("--min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY,
+                        help="Column-set similarity (0-1) from which a near match is queued for review")
+    parser.add_argument("--dry-run", action="store_true", help="Report the matches without writing anything")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        auto_map(conn, args.min_similarity, args.dry_run)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# db_tasks.py
+#
+# Database loads of the field mapping tool that run on a QThreadPool thread, so a slow server does
+# not freeze the window. Each task gets its own token; the window only applies the result of the
+# newest token per kind of load and drops the others. Tasks that are already stale when their turn
+# on the pool comes are skipped without querying.
+
+import traceback
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+
+class DbTaskSignals(QObject):
+    result = Signal(int, object)  # token, result
+    error = Signal(int, str)      # token, message
+    finished = Signal(int)        # token
+
+
+class DbTask(QRunnable):
+    """Runs fn(connection, *args) on a pool thread and reports back through signals tagged with token.
+
+    is_current, if given, is checked before querying; when it returns False the task only emits finished.
+    """
+
+    def __init__(self, token, connection, fn, *args, is_current=None):
+        super().__init__()
+        self.token = token
+        self.connection = connection
+        self.fn = fn
+        self.args = args
+        self.is_current = is_current
+        self.signals = DbTaskSignals()
+
+    def run(self):
+        if self.is_current is not None and not self.is_current():
+            print(f"Skipping stale background load {self.fn.__name__}")
+            self.signals.finished.emit(self.token)
+            return
+        try:
+            result = self.fn(self.connection, *self.args)
+        except Exception as error:
+            print(f"Error in background load {self.fn.__name__}: {error}")
+            print(traceback.format_exc())
+            self.signals.error.emit(self.token, str(error))
+        else:
+            self.signals.result.emit(self.token, result)
+        finally:
+            self.signals.finished.emit(self.token)
+
+
+def fetch_reports(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT DISTINCT report_name, report_date
+            FROM raw_egypt_weekly_reports
+            ORDER BY report_date DESC, report_name
+            """
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def fetch_sheets(conn, report_name, report_date):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT sheet_name, COUNT(*) as sheet_count
+            FROM raw_egypt_weekly_reports
+            WHERE report_name = %s AND report_date = %s
+            GROUP BY sheet_name
+            """,
+            (report_name, report_date),
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def fetch_sheet_columns(conn, report_name, report_date, sheet_name):
+    """Returns (raw_data_id, column_names, mappings, set_name) of the latest sheet version, or None.
+
+    mappings are the sheet's existing (raw_field_name, mapping_type, target_field_name, data_type, set_id)
+    rows and set_name the name of the mapping set they were saved under.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT raw_data_id, column_names
+            FROM raw_egypt_weekly_reports
+            WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+            ORDER BY version DESC
+            LIMIT 1
+            """,
+            (report_name, report_date, sheet_name),
+        )
+        result = cursor.fetchone()
+        if not result:
+            return None
+        raw_data_id, column_names = result
+
+        cursor.execute(
+            """
+            SELECT raw_field_name, mapping_type, target_field_name, data_type, set_id
+            FROM field_mappings
+            WHERE raw_data_id = %s
+            """,
+            (raw_data_id,)
+        )
+        mappings = cursor.fetchall()
+
+        set_name = None
+        if mappings:
+            cursor.execute(
+                """
+                SELECT set_name
+                FROM mapping_sets
+                WHERE set_id = %s
+                """,
+                (mappings[-1][4],)
+            )
+            row = cursor.fetchone()
+            set_name = row[0] if row else None
+        return raw_data_id, column_names, mappings, set_name
+    finally:
+        cursor.close()
+
+
+def suggest_mappings(conn, suggestion_engine, column_names):
+    """Returns (has_mappings, best_matches) for column_names from the suggestion engine."""
+    # All historical mappings, indexed once and cached on disk between sessions
+    suggestion_engine.load(conn)
+    if not suggestion_engine.entries:
+        return False, {}
+    return True, suggestion_engine.suggest_all(column_names)
@@ -14,15 +14,29 @@ from PySide6.QtWidgets import (
     QTableWidget,
     QCheckBox,
     QLabel,
-    QComboBox
+    QComboBox,
+    QProgressBar
 )
-from PySide6.QtCore import QFile, QIODevice, Qt, QSettings
+from PySide6.QtCore import QFile, QIODevice, Qt, QSettings, QThreadPool
 from PySide6.QtUiTools import QUiLoader
 from PySide6 import QtWidgets
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import re
-import difflib
+from suggestion_engine import MappingSuggestionEngine
+from db_tasks import DbTask, fetch_reports, fetch_sheets, fetch_sheet_columns, suggest_mappings
+
+DB_CONFIG = {
+    "dbname": "ReportsDB",
+    "user": "postgres",
+    "password": "123456",
+    "host": "cmms-db-01",
+    "port": "5432"
+}
+
+# On-disk cache of the mapping suggestion index, rebuilt when the mapping sets change
+SUGGESTION_CACHE_FILE = "mapping_suggestions.json"
 
 print("Script started")
 
@@ -38,6 +52,16 @@ class FieldMappingTool(QMainWindow):
         self.previous_report_index = -1
         self.previous_sheet_index = -1
         self.db_connection = None
+        # Read-only connection used by the background loads; one loader thread, so never shared
+        self.loader_connection = None
+        self.loader_pool = QThreadPool(self)
+        self.loader_pool.setMaxThreadCount(1)
+        self.request_tokens = {"reports": 0, "sheets": 0, "columns": 0, "compare": 0}
+        self.pending_loads = 0
+        self.column_rows = {}  # raw column name -> columnNamesTable row, rebuilt per sheet load
+        self.suggestion_engine = MappingSuggestionEngine(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), SUGGESTION_CACHE_FILE)
+        )
         try:
             self.load_ui()
             self.setup_ui()
@@ -109,13 +133,9 @@ class FieldMappingTool(QMainWindow):
     def connect_to_database(self):
         print("Connecting to database")
         try:
-            self.db_connection = psycopg2.connect(
-                dbname="ReportsDB",
-                user="postgres",
-                password="123456",
-                host="cmms-db-01",
-                port="5432",
-            )
+            self.db_connection = psycopg2.connect(**DB_CONFIG)
+            self.loader_connection = psycopg2.connect(**DB_CONFIG)
+            self.loader_connection.autocommit = True
             print("Connected to the database successfully!")
             self.load_reports()
         except (Exception, psycopg2.Error) as error:
@@ -165,36 +185,71 @@ class FieldMappingTool(QMainWindow):
         self.mapping_status_label = QLabel("No mapping set loaded")
         self.ui.verticalLayout.addWidget(self.mapping_status_label)
 
+        # Busy indicator shown while background loads are running
+        self.busy_indicator = QProgressBar()
+        self.busy_indicator.setRange(0, 0)
+        self.busy_indicator.setMaximumWidth(150)
+        self.busy_indicator.hide()
+        self.statusBar().addPermanentWidget(self.busy_indicator)
+
+    def new_request(self, *kinds):
+        """Starts a new request of each kind; results of older requests of those kinds are discarded."""
+        for kind in kinds:
+            self.request_tokens[kind] += 1
+        return self.request_tokens[kinds[0]]
+
+    def run_db_task(self, kind, on_result, fn, *args, title="Database Error"):
+        """Runs fn(loader_connection, *args) on the loader thread and passes its result to on_result,
+        unless a newer request of the same kind was started in the meantime."""
+        token = self.new_request(kind)
+        # Checked on the loader thread, so a request superseded while queued is never run
+        task = DbTask(token, self.loader_connection, fn, *args,
+                      is_current=lambda: token == self.request_tokens[kind])
+
+        def handle_result(task_token, result):
+            if task_token == self.request_tokens[kind]:
+                on_result(result)
+            else:
+                print(f"Discarding stale {kind} result")
+
+        def handle_error(task_token, message):
+            if task_token == self.request_tokens[kind]:
+                QMessageBox.warning(self, title, message)
+
+        def handle_finished(task_token):
+            self.pending_loads -= 1
+            self.busy_indicator.setVisible(self.pending_loads > 0)
+
+        task.signals.result.connect(handle_result)
+        task.signals.error.connect(handle_error)
+        task.signals.finished.connect(handle_finished)
+        self.pending_loads += 1
+        self.busy_indicator.show()
+        self.loader_pool.start(task)
+
+    def closeEvent(self, event):
+        self.loader_pool.waitForDone()
+        for conn in (self.loader_connection, self.db_connection):
+            if conn:
+                conn.close()
+        super().closeEvent(event)
+
     def save_apply_default_preference(self, state):
         self.settings.setValue("apply_default_mappings", state == Qt.Checked)
 
     def load_reports(self):
-        if not self.db_connection:
+        if not self.loader_connection:
             return
 
-        try:
-            cursor = self.db_connection.cursor()
-            cursor.execute(
-                """
-                SELECT DISTINCT report_name, report_date 
-                FROM raw_egypt_weekly_reports 
-                ORDER BY report_date DESC, report_name
-            """
-            )
-            reports = cursor.fetchall()
-
-            self.ui.reportComboBox.clear()
-            for report in reports:
-                self.ui.reportComboBox.addItem(f"{report[0]} - {report[1]}", report)
+        self.run_db_task("reports", self.show_reports, fetch_reports)
 
-            cursor.close()
-        except (Exception, psycopg2.Error) as error:
-            print("Error while fetching reports:", error)
-            print(traceback.format_exc())
-            QMessageBox.warning(self, "Database Error", str(error))
+    def show_reports(self, reports):
+        self.ui.reportComboBox.clear()
+        for report in reports:
+            self.ui.reportComboBox.addItem(f"{report[0]} - {report[1]}", report)
 
     def load_sheets(self, index):
-        if index < 0 or not self.db_connection:
+        if index < 0 or not self.loader_connection:
             return
 
         if self.unsaved_changes:
@@ -212,39 +267,28 @@ class FieldMappingTool(QMainWindow):
                 self.ui.reportComboBox.setCurrentIndex(self.previous_report_index)
                 return
 
+        # Column loads and comparisons started for the previous report no longer apply
+        self.new_request("columns", "compare")
+
         report_data = self.ui.reportComboBox.itemData(index)
         if not report_data:
             return
 
         report_name, report_date = report_data
+        self.run_db_task(
+            "sheets", lambda sheets: self.show_sheets(index, sheets),
+            fetch_sheets, report_name, report_date
+        )
 
-        try:
-            cursor = self.db_connection.cursor()
-            cursor.execute(
-                """
-                SELECT sheet_name, COUNT(*) as sheet_count
-                FROM raw_egypt_weekly_reports
-                WHERE report_name = %s AND report_date = %s
-                GROUP BY sheet_name
-                """,
-                (report_name, report_date),
-            )
-            sheets = cursor.fetchall()
-
-            self.ui.sheetComboBox.clear()
-            total_sheets = 0
-            for sheet in sheets:
-                self.ui.sheetComboBox.addItem(sheet[0], sheet)
-                total_sheets += sheet[1]
+    def show_sheets(self, index, sheets):
+        self.ui.sheetComboBox.clear()
+        total_sheets = 0
+        for sheet in sheets:
+            self.ui.sheetComboBox.addItem(sheet[0], sheet)
+            total_sheets += sheet[1]
 
-            self.ui.numSheetsValue.setText(str(total_sheets))
-
-            cursor.close()
-            self.previous_report_index = index  # Update previous_report_index
-        except (Exception, psycopg2.Error) as error:
-            print("Error while fetching sheets:", error)
-            print(traceback.format_exc())
-            QMessageBox.warning(self, "Database Error", str(error))
+        self.ui.numSheetsValue.setText(str(total_sheets))
+        self.previous_report_index = index  # Update previous_report_index
 
     def clear_current_mappings(self):
         for row in range(self.ui.columnNamesTable.rowCount()):
@@ -253,6 +297,54 @@ class FieldMappingTool(QMainWindow):
             self.ui.columnNamesTable.setItem(row, 3, QTableWidgetItem(""))
         self.mapping_status_label.setText("No mapping set loaded")
 
+    def set_row_mapping(self, row, mapping_type, target_field_name):
+        self.ui.columnNamesTable.item(row, 0).setCheckState(Qt.Checked)
+        self.ui.columnNamesTable.setItem(row, 2, QTableWidgetItem(mapping_type))
+        self.ui.columnNamesTable.setItem(row, 3, QTableWidgetItem(target_field_name))
+
+    def show_mappings(self, mappings):
+        """Shows (raw_field_name, mapping_type, target_field_name, ...) mappings in the table; returns how many matched a column."""
+        shown = 0
+        for raw_field_name, mapping_type, target_field_name, *_ in mappings:
+            row = self.column_rows.get(raw_field_name)
+            if row is not None:
+                self.set_row_mapping(row, mapping_type, target_field_name)
+                shown += 1
+        return shown
+
+    def upsert_field_mappings(self, cursor, mappings, with_set=False):
+        """Writes (raw_field_name, mapping_type, target_field_name, data_type[, set_id]) rows in one statement.
+
+        Returns (inserted, updated) counts.
+        """
+        # One row per raw field: ON CONFLICT cannot update the same row twice in a statement
+        mappings = list({mapping[0]: mapping for mapping in mappings}.values())
+        if not mappings:
+            return 0, 0
+        raw_data_id = self.ui.rawDataIdValue.text()
+        columns = "raw_data_id, raw_field_name, mapping_type, target_field_name, data_type"
+        updates = """mapping_type = EXCLUDED.mapping_type,
+                target_field_name = EXCLUDED.target_field_name,
+                data_type = EXCLUDED.data_type"""
+        if with_set:
+            columns += ", set_id"
+            updates += ",\n                set_id = EXCLUDED.set_id"
+        results = execute_values(
+            cursor,
+            f"""
+            INSERT INTO field_mappings ({columns})
+            VALUES %s
+            ON CONFLICT (raw_data_id, raw_field_name) DO UPDATE SET
+                {updates}
+            RETURNING (xmax = 0) AS inserted
+            """,
+            [(raw_data_id, *mapping) for mapping in mappings],
+            page_size=len(mappings),
+            fetch=True,
+        )
+        inserted = sum(1 for (was_inserted,) in results if was_inserted)
+        return inserted, len(results) - inserted
+
     def parse_column_names(self, column_names):
         print(f"Parsing column names: {type(column_names)}")  # Debug print
         if isinstance(column_names, list):
@@ -483,14 +575,7 @@ class FieldMappingTool(QMainWindow):
             mappings = cursor.fetchall()
             if mappings:
                 # Update the interface with the loaded mappings
-                for mapping in mappings:
-                    raw_field_name, mapping_type, target_field_name, data_type = mapping
-                    for row in range(self.ui.columnNamesTable.rowCount()):
-                        if self.ui.columnNamesTable.item(row, 1).text() == raw_field_name:
-                            self.ui.columnNamesTable.item(row, 0).setCheckState(Qt.Checked)
-                            self.ui.columnNamesTable.setItem(row, 2, QTableWidgetItem(mapping_type))
-                            self.ui.columnNamesTable.setItem(row, 3, QTableWidgetItem(target_field_name))
-                            break
+                self.show_mappings(mappings)
                 # Update current mapping set name
                 cursor.execute(
                     """
@@ -544,9 +629,8 @@ class FieldMappingTool(QMainWindow):
             set_id = cursor.fetchone()[0]
             print(f"Inserted/Updated mapping set with ID: {set_id}")
 
-            # Save individual field mappings
-            mappings_inserted = 0
-            mappings_updated = 0
+            # Save all field mappings in one upsert
+            mappings = []
             for row in range(self.ui.columnNamesTable.rowCount()):
                 raw_field_name = self.ui.columnNamesTable.item(row, 1).text()
                 field_type = (
@@ -561,32 +645,15 @@ class FieldMappingTool(QMainWindow):
                 )
 
                 if field_type and target_field_name:
-                    cursor.execute(
-                        """
-                        INSERT INTO field_mappings (raw_data_id, raw_field_name, mapping_type, set_id, target_field_name, data_type)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (raw_data_id, raw_field_name) DO UPDATE
-                        SET mapping_type = EXCLUDED.mapping_type,
-                            set_id = EXCLUDED.set_id,
-                            target_field_name = EXCLUDED.target_field_name,
-                            data_type = EXCLUDED.data_type;
-                        """,
-                        (
-                            self.ui.rawDataIdValue.text(),
-                            raw_field_name,
-                            field_type,
-                            set_id,
-                            target_field_name,
-                            self.field_data_types.get(target_field_name, "VARCHAR")
-                        ),
-                    )
-                    if cursor.rowcount == 1:
-                        mappings_inserted += 1
-                    else:
-                        mappings_updated += 1
-                    print(
-                        f"Inserted/Updated mapping: {raw_field_name} -> {target_field_name} ({field_type})"
-                    )
+                    mappings.append((
+                        raw_field_name,
+                        field_type,
+                        target_field_name,
+                        self.field_data_types.get(target_field_name, "VARCHAR"),
+                        set_id
+                    ))
+
+            mappings_inserted, mappings_updated = self.upsert_field_mappings(cursor, mappings, with_set=True)
 
             self.db_connection.commit()
             print(
@@ -611,7 +678,7 @@ class FieldMappingTool(QMainWindow):
                 cursor.close()
 
     def load_column_names(self, index):
-        if index < 0 or not self.db_connection:
+        if index < 0 or not self.loader_connection:
             return
 
         if self.unsaved_changes:
@@ -641,109 +708,65 @@ class FieldMappingTool(QMainWindow):
             return
 
         report_name, report_date = report_data
+        self.new_request("compare")
+        self.run_db_task(
+            "columns", lambda result: self.show_column_names(index, result),
+            fetch_sheet_columns, report_name, report_date, sheet_name
+        )
 
-        try:
-            cursor = self.db_connection.cursor()
-            cursor.execute(
-                """
-                SELECT raw_data_id, column_names
-                FROM raw_egypt_weekly_reports
-                WHERE report_name = %s AND report_date = %s AND sheet_name = %s
-                LIMIT 1
-                """,
-                (report_name, report_date, sheet_name),
-            )
-            result = cursor.fetchone()
-
-            if result:
-                raw_data_id, column_names = result
-                self.ui.rawDataIdValue.setText(str(raw_data_id))
-
-                print(f"Raw column_names: {column_names}")  # Debug print
-
-                # Parse column_names
-                column_names = self.parse_column_names(column_names)
-
-                print(f"Parsed column_names: {column_names}")  # Debug print
-
-                self.ui.columnNamesTable.setRowCount(len(column_names))
-                self.ui.columnNamesTable.setColumnCount(4)
-                self.ui.columnNamesTable.setHorizontalHeaderLabels(
-                    ["Select", "Column Name", "Field Type", "Mapped Field"]
-                )
-
-                for i, column_name in enumerate(column_names):
-                    checkbox = QTableWidgetItem()
-                    checkbox.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
-                    checkbox.setCheckState(Qt.Unchecked)
-                    self.ui.columnNamesTable.setItem(i, 0, checkbox)
-                    self.ui.columnNamesTable.setItem(i, 1, QTableWidgetItem(column_name))
+    def show_column_names(self, index, result):
+        if not result:
+            print("No column names found for the selected report and sheet.")
+            return
 
-                print(f"Loaded {len(column_names)} fields.")
+        raw_data_id, column_names, mappings, set_name = result
+        self.ui.rawDataIdValue.setText(str(raw_data_id))
 
-                # Attempt to load existing mappings
-                self.load_existing_mappings(raw_data_id)
+        print(f"Raw column_names: {column_names}")  # Debug print
 
-                # If no existing mappings and the checkbox is checked, apply default mappings
-                if not self.mappings_loaded and self.apply_default_checkbox.isChecked():
-                    self.apply_default_mapping()
+        # Parse column_names
+        column_names = self.parse_column_names(column_names)
 
-                self.previous_sheet_index = index  # Update previous_sheet_index
-            else:
-                print("No column names found for the selected report and sheet.")
+        print(f"Parsed column_names: {column_names}")  # Debug print
 
-            cursor.close()
-        except (Exception, psycopg2.Error) as error:
-            print("Error while fetching column names:", error)
-            print(traceback.format_exc())
-            QMessageBox.warning(self, "Database Error", str(error))
+        self.ui.columnNamesTable.setRowCount(len(column_names))
+        self.ui.columnNamesTable.setColumnCount(4)
+        self.ui.columnNamesTable.setHorizontalHeaderLabels(
+            ["Select", "Column Name", "Field Type", "Mapped Field"]
+        )
 
-    def load_existing_mappings(self, raw_data_id):
-        try:
-            cursor = self.db_connection.cursor()
-            cursor.execute(
-                """
-                SELECT raw_field_name, mapping_type, target_field_name, data_type, set_id
-                FROM field_mappings
-                WHERE raw_data_id = %s
-                """,
-                (raw_data_id,)
-            )
-            mappings = cursor.fetchall()
-            if mappings:
-                self.mappings_loaded = True
-                self.unsaved_changes = False  # No unsaved changes after loading
-                # Update the interface with the loaded mappings
-                for mapping in mappings:
-                    raw_field_name, mapping_type, target_field_name, data_type, set_id = mapping
-                    for row in range(self.ui.columnNamesTable.rowCount()):
-                        if self.ui.columnNamesTable.item(row, 1).text() == raw_field_name:
-                            self.ui.columnNamesTable.item(row, 0).setCheckState(Qt.Checked)
-                            self.ui.columnNamesTable.setItem(row, 2, QTableWidgetItem(mapping_type))
-                            self.ui.columnNamesTable.setItem(row, 3, QTableWidgetItem(target_field_name))
-                            break
-                # Get the mapping set name
-                cursor.execute(
-                    """
-                    SELECT set_name
-                    FROM mapping_sets
-                    WHERE set_id = %s
-                    """,
-                    (set_id,)
-                )
-                set_name = cursor.fetchone()[0]
-                self.current_mapping_set_name = set_name
-                self.mapping_status_label.setText(f"Loaded mappings from set: {set_name}")
-            else:
-                self.mappings_loaded = False
-                self.mapping_status_label.setText("No existing mappings found.")
-        except (Exception, psycopg2.Error) as error:
-            print("Error while loading existing mappings:", error)
-            print(traceback.format_exc())
-            QMessageBox.warning(self, "Database Error", str(error))
-        finally:
-            if cursor:
-                cursor.close()
+        self.column_rows = {}
+        for i, column_name in enumerate(column_names):
+            checkbox = QTableWidgetItem()
+            checkbox.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
+            checkbox.setCheckState(Qt.Unchecked)
+            self.ui.columnNamesTable.setItem(i, 0, checkbox)
+            self.ui.columnNamesTable.setItem(i, 1, QTableWidgetItem(column_name))
+            # First row wins for repeated names, as the previous row scans did
+            self.column_rows.setdefault(column_name, i)
+
+        print(f"Loaded {len(column_names)} fields.")
+
+        # Show the sheet's existing mappings, loaded together with its columns
+        self.show_existing_mappings(mappings, set_name)
+
+        # If no existing mappings and the checkbox is checked, apply default mappings
+        if not self.mappings_loaded and self.apply_default_checkbox.isChecked():
+            self.apply_default_mapping()
+
+        self.previous_sheet_index = index  # Update previous_sheet_index
+
+    def show_existing_mappings(self, mappings, set_name):
+        if mappings:
+            self.mappings_loaded = True
+            self.unsaved_changes = False  # No unsaved changes after loading
+            # Update the interface with the loaded mappings
+            self.show_mappings(mappings)
+            self.current_mapping_set_name = set_name
+            self.mapping_status_label.setText(f"Loaded mappings from set: {set_name}")
+        else:
+            self.mappings_loaded = False
+            self.mapping_status_label.setText("No existing mappings found.")
 
     def load_mapping_set(self):
         self.clear_current_mappings()
@@ -795,21 +818,9 @@ class FieldMappingTool(QMainWindow):
             )
             mappings = cursor.fetchall()
 
-            for row in range(self.ui.columnNamesTable.rowCount()):
-                raw_field_name = self.ui.columnNamesTable.item(row, 1).text()
-                mapping = next((m for m in mappings if m[0] == raw_field_name), None)
-                if mapping:
-                    self.ui.columnNamesTable.item(row, 0).setCheckState(Qt.Checked)
-                    self.ui.columnNamesTable.setItem(
-                        row, 2, QTableWidgetItem(mapping[1])
-                    )
-                    self.ui.columnNamesTable.setItem(
-                        row, 3, QTableWidgetItem(mapping[2])
-                    )
-                else:
-                    self.ui.columnNamesTable.item(row, 0).setCheckState(Qt.Unchecked)
-                    self.ui.columnNamesTable.setItem(row, 2, QTableWidgetItem(""))
-                    self.ui.columnNamesTable.setItem(row, 3, QTableWidgetItem(""))
+            # Unmapped columns are cleared, mapped ones are filled in through the column index
+            self.clear_current_mappings()
+            self.show_mappings(mappings)
 
             self.mapping_status_label.setText(f"Proposed mappings from set: {set_id}")
 
@@ -829,68 +840,36 @@ class FieldMappingTool(QMainWindow):
 
     def compare_mappings(self):
         print("Comparing mappings")
-        try:
-            cursor = self.db_connection.cursor()
-
-            # Get all existing mapping sets
-            cursor.execute("SELECT set_id, set_name FROM mapping_sets")
-            mapping_sets = cursor.fetchall()
-
-            if not mapping_sets:
-                QMessageBox.information(
-                    self,
-                    "No Mapping Sets",
-                    "No existing mapping sets found for comparison.",
-                )
-                return
-
-            current_columns = [
-                self.ui.columnNamesTable.item(row, 1).text()
-                for row in range(self.ui.columnNamesTable.rowCount())
-            ]
+        if not self.loader_connection:
+            return
 
-            best_matches = {}
-            for set_id, set_name in mapping_sets:
-                cursor.execute(
-                    """
-                    SELECT raw_field_name, mapping_type, target_field_name 
-                    FROM field_mappings 
-                    WHERE set_id = %s
-                """,
-                    (set_id,),
-                )
-                existing_mappings = cursor.fetchall()
-
-                for current_col in current_columns:
-                    best_match = self.find_best_match(current_col, existing_mappings)
-                    if best_match:
-                        if (
-                            current_col not in best_matches
-                            or best_matches[current_col][1] < best_match[1]
-                        ):
-                            best_matches[current_col] = (
-                                best_match[0],
-                                best_match[1],
-                                set_name,
-                            )
-
-            if not best_matches:
-                QMessageBox.information(
-                    self, "No Matches", "No suitable matches found for comparison."
-                )
-                return
+        current_columns = [
+            self.ui.columnNamesTable.item(row, 1).text()
+            for row in range(self.ui.columnNamesTable.rowCount())
+        ]
+        self.run_db_task(
+            "compare", self.show_comparison,
+            suggest_mappings, self.suggestion_engine, current_columns,
+            title="Comparison Error"
+        )
 
-            self.display_suggested_mappings(best_matches)
+    def show_comparison(self, result):
+        has_mappings, best_matches = result
+        if not has_mappings:
+            QMessageBox.information(
+                self,
+                "No Mapping Sets",
+                "No existing mapping sets found for comparison.",
+            )
+            return
 
-        except (Exception, psycopg2.Error) as error:
-            error_message = (
-                f"Error while comparing mappings: {str(error)}\n\n{traceback.format_exc()}"
+        if not best_matches:
+            QMessageBox.information(
+                self, "No Matches", "No suitable matches found for comparison."
             )
-            print(error_message)
-            QMessageBox.warning(self, "Comparison Error", error_message)
-        finally:
-            if cursor:
-                cursor.close()
+            return
+
+        self.display_suggested_mappings(best_matches)
 
     def toggle_all_checkboxes(self, table, state):
         for row in range(table.rowCount()):
@@ -907,19 +886,27 @@ class FieldMappingTool(QMainWindow):
         layout.addWidget(select_all_checkbox)
 
         table = QTableWidget()
-        table.setColumnCount(6)
-        table.setHorizontalHeaderLabels(["Select", "Current Field", "Suggested Field", "Mapping Type", "Target Field", "Mapping Set"])
+        table.setColumnCount(7)
+        table.setHorizontalHeaderLabels(["Select", "Current Field", "Suggested Field", "Mapping Type", "Target Field", "Mapping Set", "Score"])
         table.setRowCount(len(best_matches))
 
-        for row, (current_field, (suggested_field, ratio, set_name)) in enumerate(best_matches.items()):
+        for row, (current_field, candidates) in enumerate(best_matches.items()):
+            score, suggested_field, set_name = candidates[0]
             checkbox = QCheckBox()
             table.setCellWidget(row, 0, checkbox)
         
             table.setItem(row, 1, QTableWidgetItem(current_field))
-            table.setItem(row, 2, QTableWidgetItem(suggested_field[0]))
+            suggested_item = QTableWidgetItem(suggested_field[0])
+            # The other top candidates are listed in the tooltip
+            suggested_item.setToolTip("\n".join(
+                f"{candidate_score:.2f}  {candidate[0]} -> {candidate[2]} ({candidate_set})"
+                for candidate_score, candidate, candidate_set in candidates
+            ))
+            table.setItem(row, 2, suggested_item)
             table.setItem(row, 3, QTableWidgetItem(suggested_field[1]))
             table.setItem(row, 4, QTableWidgetItem(suggested_field[2]))
             table.setItem(row, 5, QTableWidgetItem(set_name))
+            table.setItem(row, 6, QTableWidgetItem(f"{score:.2f}"))
 
         select_all_checkbox.stateChanged.connect(lambda state: self.toggle_all_checkboxes(table, state))
 
@@ -933,23 +920,12 @@ class FieldMappingTool(QMainWindow):
         suggestion_dialog.setLayout(layout)
         suggestion_dialog.exec_()
 
-    def find_best_match(self, current_field, existing_mappings):
-        best_match = None
-        highest_ratio = 0
-        for raw_field, mapping_type, target_field in existing_mappings:
-            ratio = difflib.SequenceMatcher(None, current_field.lower(), raw_field.lower()).ratio()
-            if ratio > highest_ratio:
-                highest_ratio = ratio
-                best_match = (raw_field, mapping_type, target_field)
-        
-        return (best_match, highest_ratio) if best_match and highest_ratio > 0.6 else None
-
-
     def apply_suggested_mappings(self, table):
         applied_count = 0
         database_update_count = 0
         try:
             cursor = self.db_connection.cursor()
+            mappings = []
             for row in range(table.rowCount()):
                 checkbox = table.cellWidget(row, 0)
                 if checkbox.isChecked():
@@ -957,36 +933,14 @@ class FieldMappingTool(QMainWindow):
                     mapping_type = table.item(row, 3).text()
                     target_field = table.item(row, 4).text()
                     data_type = self.field_data_types.get(target_field, "VARCHAR")
+                    mappings.append((current_field, mapping_type, target_field, data_type))
+
+            # Update the UI
+            applied_count = self.show_mappings(mappings)
 
-                    # Update the UI
-                    for i in range(self.ui.columnNamesTable.rowCount()):
-                        if self.ui.columnNamesTable.item(i, 1).text() == current_field:
-                            self.ui.columnNamesTable.item(i, 0).setCheckState(Qt.Checked)
-                            self.ui.columnNamesTable.setItem(i, 2, QTableWidgetItem(mapping_type))
-                            self.ui.columnNamesTable.setItem(i, 3, QTableWidgetItem(target_field))
-                            applied_count += 1
-                            break
-
-                    # Update the database
-                    cursor.execute(
-                        """
-                        INSERT INTO field_mappings (raw_data_id, raw_field_name, mapping_type, target_field_name, data_type)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (raw_data_id, raw_field_name) 
-                        DO UPDATE SET 
-                            mapping_type = EXCLUDED.mapping_type, 
-                            target_field_name = EXCLUDED.target_field_name,
-                            data_type = EXCLUDED.data_type;
-                        """,
-                        (
-                            self.ui.rawDataIdValue.text(),
-                            current_field,
-                            mapping_type,
-                            target_field,
-                            data_type,
-                        ),
-                    )
-                    database_update_count += 1
+            # Update the database
+            inserted, updated = self.upsert_field_mappings(cursor, mappings)
+            database_update_count = inserted + updated
 
             self.db_connection.commit()
             QMessageBox.information(
@@ -0,0 +1,157 @@
+# suggestion_engine.py
+
+import os
+import re
+import json
+from collections import defaultdict
+
+# Minimum trigram similarity (Dice coefficient) for a historical raw field to be suggested
+DEFAULT_MIN_SCORE = 0.5
+DEFAULT_TOP_K = 5
+
+class MappingSuggestionEngine:
+    """
+    Suggests mappings for raw column names from every historical field mapping.
+
+    All mappings are loaded in one query and their normalized raw field names are indexed by
+    character trigram, so a column is only compared with the names it shares trigrams with.
+    The index is saved to cache_file as JSON (plain data, never code) together with a signature of
+    the mapping tables and is rebuilt only when that signature changes.
+    """
+
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_file, min_score=DEFAULT_MIN_SCORE):
+        self.cache_file = cache_file
+        self.min_score = min_score
+        self.signature = None
+        self.entries = []  # (raw_field_name, mapping_type, target_field_name, set_name)
+        self.entry_trigrams = []
+        self.index = {}
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(re.sub(r'[^0-9a-z]+', ' ', str(name).lower()).split())
+
+    @classmethod
+    def trigrams(cls, name):
+        """Character trigrams of each word, padded like pg_trgm: 'qty' -> '  q', ' qt', 'qty', 'ty '."""
+        grams = set()
+        for word in cls.normalize(name).split():
+            padded = f"  {word} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    def get_signature(self, conn):
+        """Summarizes the mapping tables in one row, so an unchanged index is not reloaded.
+
+        Returned as a list of strings, so it compares equal to the copy stored in the JSON cache.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*), MAX(f.mapping_id),
+                       SUM(hashtext(concat_ws(':', f.mapping_id, s.set_id, s.set_name, f.raw_field_name,
+                                              f.mapping_type, f.target_field_name))::BIGINT)
+                FROM field_mappings f
+                JOIN mapping_sets s ON f.set_id = s.set_id
+            """)
+            return [str(value) for value in cursor.fetchone()]
+        finally:
+            cursor.close()
+
+    def load(self, conn):
+        """Loads the index from the disk cache, or rebuilds it if the mappings changed."""
+        signature = self.get_signature(conn)
+        if self.signature == signature:
+            return
+        if self.load_cache(signature):
+            return
+        self.build(conn)
+        self.signature = signature
+        self.save_cache()
+
+    def build(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT DISTINCT f.raw_field_name, f.mapping_type, f.target_field_name, s.set_name
+                FROM field_mappings f
+                JOIN mapping_sets s ON f.set_id = s.set_id
+                WHERE f.target_field_name IS NOT NULL
+                ORDER BY s.set_name, f.raw_field_name
+            """)
+            self.entries = [tuple(entry) for entry in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+        self.entry_trigrams = [self.trigrams(entry[0]) for entry in self.entries]
+        index = defaultdict(list)
+        for entry_id, grams in enumerate(self.entry_trigrams):
+            for gram in grams:
+                index[gram].append(entry_id)
+        self.index = dict(index)
+        print(f"Built suggestion index: {len(self.entries)} mappings, {len(self.index)} trigrams")
+
+    def load_cache(self, signature):
+        if not os.path.exists(self.cache_file):
+            return False
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') != self.CACHE_VERSION or cached.get('signature') != signature:
+                return False
+            entries = [tuple(entry) for entry in cached['entries']]
+            entry_trigrams = [set(grams) for grams in cached['entry_trigrams']]
+            index = {gram: list(entry_ids) for gram, entry_ids in cached['index'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Ignoring unreadable suggestion cache {self.cache_file}: {e}")
+            return False
+        self.signature = signature
+        self.entries = entries
+        self.entry_trigrams = entry_trigrams
+        self.index = index
+        return True
+
+    def save_cache(self):
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': self.CACHE_VERSION,
+                    'signature': self.signature,
+                    'entries': self.entries,
+                    'entry_trigrams': [sorted(grams) for grams in self.entry_trigrams],
+                    'index': self.index
+                }, f)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not write suggestion cache {self.cache_file}: {e}")
+
+    def suggest(self, column_name, top_k=DEFAULT_TOP_K):
+        """Returns up to top_k (score, (raw_field_name, mapping_type, target_field_name), set_name), best first."""
+        grams = self.trigrams(column_name)
+        if not grams:
+            return []
+
+        shared = defaultdict(int)
+        for gram in grams:
+            for entry_id in self.index.get(gram, ()):
+                shared[entry_id] += 1
+
+        candidates = []
+        for entry_id, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.entry_trigrams[entry_id]))
+            if score >= self.min_score:
+                raw_field_name, mapping_type, target_field_name, set_name = self.entries[entry_id]
+                candidates.append((score, (raw_field_name, mapping_type, target_field_name), set_name))
+
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[2], candidate[1][0]))
+        return candidates[:top_k]
+
+    def suggest_all(self, column_names, top_k=DEFAULT_TOP_K):
+        """Returns {column_name: suggestions} for the columns that have at least one suggestion."""
+        suggestions = {}
+        for column_name in column_names:
+            candidates = self.suggest(column_name, top_k)
+            if candidates:
+                suggestions[column_name] = candidates
+        return suggestions
@@ -0,0 +1,148 @@
+# date_parser.py
+
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+DEFAULT_CACHE_SIZE = 10000
+
+class DateParser:
+    """
+    Memoized date parsing for report ingestion.
+
+    Weekly reports repeat the same few hundred distinct date strings thousands of times, so
+    every distinct input is parsed once and kept in a bounded (LRU) cache. The values of a
+    column that are not cached yet are converted in one batch, using a format inferred once
+    per column; values that do not fit that format are parsed individually.
+
+    The cache is keyed on (format, value), so an ambiguous value such as "01/02/2024" parsed
+    under one column's format is never reused for a column with another format. Column formats
+    only hold for one sheet or DataFrame; call reset_formats() before starting the next.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.column_formats = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_null(value):
+        if value is None:
+            return True
+        if isinstance(value, str):
+            return value.strip().lower() in ('', 'nat', 'nan')
+        try:
+            return bool(pd.isna(value))
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def to_date(value):
+        if value is None or pd.isna(value):
+            return None
+        if isinstance(value, datetime):  # Includes pd.Timestamp
+            return value.date()
+        return value
+
+    def reset_formats(self):
+        """Forgets the inferred column formats; cached dates stay valid under their own format."""
+        self.column_formats = {}
+
+    def column_format(self, column, values):
+        """Returns the format of column, inferred from its first text value the first time it is seen."""
+        if column is not None and column in self.column_formats:
+            return self.column_formats[column]
+        first_text = next((value for value in values if isinstance(value, str) and not self.is_null(value)), None)
+        date_format = guess_datetime_format(first_text) if first_text is not None else None
+        if column is not None and date_format is not None:
+            self.column_formats[column] = date_format
+        return date_format
+
+    def remember(self, value, result, date_format=None):
+        key = (date_format, value)
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def lookup(self, value, date_format=None):
+        """Returns (found, date) for a value parsed under date_format, without parsing it."""
+        if self.is_null(value):
+            return True, None
+        if isinstance(value, (datetime, date)):
+            return True, self.to_date(value)
+        key = (date_format, value)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return True, self.cache[key]
+        return False, None
+
+    def parse_one(self, value):
+        try:
+            return self.to_date(pd.to_datetime(value))
+        except Exception as e:
+            logging.error(f"Date parsing error: {e}, value: {value}")
+            return None
+
+    def convert(self, values, date_format=None):
+        """Parses distinct, uncached values in one batch with date_format and returns their dates in order."""
+        self.misses += len(values)
+        texts = [value for value in values if isinstance(value, str)]
+        parsed = {}
+
+        if texts and date_format is not None:
+            try:
+                converted = pd.to_datetime(pd.Series(texts, dtype=object), format=date_format, errors='coerce')
+                for text, timestamp in zip(texts, converted):
+                    if not pd.isna(timestamp):
+                        parsed[text] = self.to_date(timestamp)
+            except Exception as e:
+                logging.debug(f"Batch date parsing with format {date_format} failed: {e}")
+
+        # Values that did not match the column format (or are not text) are parsed one by one
+        return [parsed[value] if value in parsed else self.parse_one(value) for value in values]
+
+    def parse(self, value):
+        """Parses a single value to a date (or None), using the cache."""
+        found, result = self.lookup(value)
+        if found:
+            return result
+        result = self.convert([value])[0]
+        self.remember(value, result)
+        return result
+
+    def parse_series(self, values, column=None):
+        """Parses a column of values to dates (or None); each distinct value is parsed at most once."""
+        if not isinstance(values, pd.Series):
+            values = pd.Series(values, dtype=object)
+        values = values.astype(object).where(values.notna(), None)
+
+        distinct = pd.unique(values)
+        date_format = self.column_format(column, distinct)
+        results = {}
+        pending = []
+        for value in distinct:
+            found, result = self.lookup(value, date_format)
+            if found:
+                results[value] = result
+            else:
+                pending.append(value)
+
+        if pending:
+            for value, result in zip(pending, self.convert(pending, date_format)):
+                self.remember(value, result, date_format)
+                results[value] = result
+
+        return values.map(lambda value: results[value]).astype(object)
+
+    def stats(self):
+        return f"{len(self.cache)} cached dates, {self.hits} hits, {self.misses} parsed"
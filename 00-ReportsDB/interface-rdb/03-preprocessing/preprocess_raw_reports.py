@@ -1,11 +1,18 @@
 import psycopg2
 import json
 import traceback
+import io
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from psycopg2 import sql
-from datetime import datetime
+from psycopg2.extras import execute_values
+from datetime import date, datetime
 import logging
 import pandas as pd
 import numpy as np
+from date_parser import DateParser
 
 # Set up logging
 logging.basicConfig(
@@ -14,6 +21,29 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# ReportsDB connection settings
+DB_CONFIG = {
+    "dbname": "ReportsDB",
+    "user": "postgres",
+    "password": "123456",
+    "host": "cmms-db-01",
+    "port": "5432"
+}
+
+# Connection held by each batch worker process (see init_batch_worker)
+worker_conn = None
+
+# Memoized date parser shared by all sheets processed in this process
+date_parser = DateParser()
+
+# Bulk write settings for preprocessed rows and error records
+DEFAULT_WRITE_METHOD = 'copy'
+DEFAULT_BATCH_SIZE = 5000
+
+# python: rows are cast in this process; sql: one call to preprocess_egypt_weekly_sheet()
+# (scripts-rdb/create preprocess sheet function.txt) does it on the server
+DEFAULT_ENGINE = 'python'
+
 def remove_nat_nan(value):
     if pd.isna(value) or value is None:
         return None
@@ -44,13 +74,7 @@ def safe_float(value):
         return None
 
 def flexible_date_parse(date_value):
-    if pd.isna(date_value) or date_value == 'NaT' or date_value is None:
-        return None
-    try:
-        return pd.to_datetime(date_value).date()
-    except Exception as e:
-        logging.error(f"Date parsing error: {e}, value: {date_value}")
-        return None
+    return date_parser.parse(date_value)
 
 def get_field_mappings(conn, raw_data_id):
     cursor = conn.cursor()
@@ -64,37 +88,101 @@ def get_field_mappings(conn, raw_data_id):
     finally:
         cursor.close()
 
-def insert_processed_rows(cursor, rows):
-    if not rows:
-        return
-    columns = rows[0].keys()
-    query = sql.SQL("INSERT INTO preprocessed_egypt_weekly_data ({}) VALUES ({})").format(
-        sql.SQL(', ').join(map(sql.Identifier, columns)),
-        sql.SQL(', ').join(sql.Placeholder() * len(columns))
-    )
-    cursor.executemany(query, [tuple(row.values()) for row in rows])
-
-def insert_error_records(cursor, error_records):
+def encode_copy_value(value):
+    """Encodes a value for COPY ... FROM STDIN text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    else:
+        value = str(value)
+    return (value.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+class MissingMappingsError(Exception):
+    """Raised when a sheet has no field mappings and the Default Mapping is not used."""
+
+class BulkWriter:
+    """Writes row dicts to a table in batches, with COPY FROM STDIN or multi-row INSERTs (execute_values).
+
+    All rows written through one writer must have the same keys. Rows written and time spent
+    are accumulated so the caller can report rows/sec.
+    """
+
+    def __init__(self, cursor, table, method=DEFAULT_WRITE_METHOD, batch_size=DEFAULT_BATCH_SIZE):
+        if method not in ('copy', 'values'):
+            raise ValueError(f"Unknown write method: {method}")
+        self.cursor = cursor
+        self.table = table
+        self.method = method
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.seconds = 0.0
+
+    def write(self, rows):
+        for i in range(0, len(rows), self.batch_size):
+            batch = rows[i:i+self.batch_size]
+            start = time.perf_counter()
+            if self.method == 'copy':
+                self.copy_batch(batch)
+            else:
+                self.insert_batch(batch)
+            self.seconds += time.perf_counter() - start
+            self.rows_written += len(batch)
+
+    def copy_batch(self, rows):
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(encode_copy_value(row.get(column)) for column in columns))
+            buffer.write('\n')
+        buffer.seek(0)
+        query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(self.table),
+            sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+        self.cursor.copy_expert(query.as_string(self.cursor), buffer)
+
+    def insert_batch(self, rows):
+        columns = list(rows[0].keys())
+        query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            sql.Identifier(self.table),
+            sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+        execute_values(
+            self.cursor,
+            query.as_string(self.cursor),
+            [tuple(row.get(column) for column in columns) for row in rows],
+            page_size=self.batch_size
+        )
+
+    def summary(self):
+        rate = self.rows_written / self.seconds if self.seconds else 0
+        return f"{self.rows_written} rows to {self.table} in {self.seconds:.2f}s ({rate:.0f} rows/s, {self.method})"
+
+def insert_error_records(cursor, error_records, method=DEFAULT_WRITE_METHOD, batch_size=DEFAULT_BATCH_SIZE):
     if not error_records:
         return
-    cursor.executemany("""
-        INSERT INTO preprocessing_errors 
-        (raw_data_id, report_name, report_date, sheet_name, original_line, error_message)
-        VALUES (%(raw_data_id)s, %(report_name)s, %(report_date)s, %(sheet_name)s, %(original_line)s, %(error_message)s)
-    """, error_records)
+    BulkWriter(cursor, 'preprocessing_errors', method, batch_size).write(error_records)
 
 def clean_row(row):
     """Applies NaT and NaN removal to a row."""
     return [remove_nat_nan(value) for value in row]
 
 def get_available_reports(conn):
-    """Fetches available reports from the database that haven't been preprocessed."""
+    """Fetches the latest versions of the reports that haven't been preprocessed."""
     cursor = conn.cursor()
     try:
         cursor.execute("""
             SELECT raw_data_id, report_name, report_date, sheet_name
             FROM raw_egypt_weekly_reports
-            WHERE NOT preprocessed
+            WHERE NOT preprocessed AND NOT superseded
             ORDER BY report_date DESC, report_name, sheet_name
         """)
         return cursor.fetchall()
@@ -147,21 +235,26 @@ def get_default_mappings(conn):
     finally:
         cursor.close()
 
-def process_chunk(chunk, field_mappings, default_mappings, raw_data_id, report_name, report_date, sheet_name):
+def process_chunk(chunk, field_mappings, default_mappings, raw_data_id, report_name, report_date, sheet_name,
+                  original_lines=None):
     processed_rows = []
     error_records = []
     
     logging.debug(f"Processing chunk. Type: {type(chunk)}, Length: {len(chunk)}")
     
+    # report_date is the same for the whole sheet
+    parsed_report_date = flexible_date_parse(report_date)
+    
     for index, row in enumerate(chunk):
+        original_line = original_lines[index] if original_lines else index + 1
         try:
             processed_row = clean_and_process_row(row, field_mappings, default_mappings)
             processed_row.update({
                 'raw_data_id': raw_data_id,
                 'report_name': report_name,
-                'report_date': flexible_date_parse(report_date),
+                'report_date': parsed_report_date,
                 'sheet_name': sheet_name,
-                'original_line': index + 1
+                'original_line': original_line
             })
             processed_rows.append(processed_row)
         except Exception as e:
@@ -173,7 +266,7 @@ def process_chunk(chunk, field_mappings, default_mappings, raw_data_id, report_n
                 'report_name': report_name,
                 'report_date': report_date,
                 'sheet_name': sheet_name,
-                'original_line': index + 1,
+                'original_line': original_line,
                 'error_message': error_message
             })
     
@@ -229,57 +322,268 @@ def process_value(value, data_type):
     
     return safe_string(value)
 
-def preprocess_egypt_weekly_data(conn, raw_data_id, report_name, report_date, sheet_name):
+def parse_data_type(data_type):
+    """Splits a mapping data_type such as 'VARCHAR(50)' into its kind and max length."""
+    if not data_type:
+        return None, None
+    if data_type.startswith('VARCHAR'):
+        try:
+            return 'VARCHAR', int(data_type.split('(')[1].rstrip(')'))
+        except (IndexError, ValueError):
+            return 'VARCHAR', None  # Default to no max length if not specified
+    return data_type, None
+
+def as_strings(values, nulls, max_length=None):
+    """Vectorized safe_string over the non-null values of a column."""
+    strings = values.astype(str)
+    if max_length:
+        strings = strings.str[:max_length]
+    return strings.where(~nulls, None)
+
+def as_numbers(values, text, is_text, nulls):
+    """Vectorized float() over the non-null values of a column; unparseable values become NaN."""
+    # float() ignores surrounding whitespace in text
+    return pd.to_numeric(text.str.strip().where(is_text, values).where(~nulls), errors='coerce')
+
+def process_column(values, data_type, column=None):
+    """Applies a mapping's data type to a whole column at once (same results as process_value per cell)."""
+    kind, max_length = parse_data_type(data_type)
+
+    # Text view of the column so .str methods are safe on mixed columns
+    is_text = values.map(type).eq(str)
+    text = values.where(is_text, '')
+    # Vectorized remove_nat_nan
+    nulls = values.isna() | (is_text & text.str.lower().isin(['nat', 'nan']))
+
+    if kind == 'INT':
+        numbers = as_numbers(values, text, is_text, nulls)
+        if np.isinf(numbers).any():
+            raise OverflowError("cannot convert float infinity to integer")
+        return np.trunc(numbers).astype('Int64').astype(object).where(numbers.notna(), None)
+    if kind == 'MONEY':
+        numbers = as_numbers(values, text, is_text, nulls)
+        return numbers.astype(object).where(numbers.notna(), None)
+    if kind == 'DATE':
+        return date_parser.parse_series(values.where(~nulls), column)
+    if kind == 'BOOLEAN':
+        return pd.Series(True, index=values.index, dtype=object).where(~nulls, None)
+    if kind == 'VARCHAR':
+        return as_strings(values, nulls, max_length)
+    return as_strings(values, nulls)
+
+def process_chunk_frame(chunk, field_mappings, default_mappings, raw_data_id, report_name, report_date, sheet_name,
+                        original_lines=None):
+    """Column-wise version of process_chunk: each mapping is applied once per column of the chunk.
+
+    If a column cannot be converted as a whole, the chunk is reprocessed row by row with
+    process_chunk so that the failing rows are captured as preprocessing errors.
+    """
+    if not chunk:
+        return [], []
+
+    try:
+        df = pd.DataFrame(chunk, dtype=object)
+        processed = pd.DataFrame(index=df.index)
+        additional = pd.DataFrame(index=df.index)
+
+        for col in df.columns:
+            mapping = field_mappings.get(col) or default_mappings.get(col)
+            if not mapping:
+                logging.warning(f"No mapping found for column: {col}")
+                continue
+
+            target_field = mapping['target']
+            if mapping['type'] in ['identifier', 'mrl', 'fulfillment']:
+                processed[target_field] = process_column(df[col], mapping.get('data_type'), col)
+            elif mapping['type'] == 'additional':
+                additional[target_field] = df[col].astype(str).where(df[col].notna(), None)
+
+        # Build every row's additional_data JSON in one pass
+        if len(additional.columns):
+            processed['additional_data'] = additional.to_json(orient='records', lines=True).splitlines()
+        else:
+            processed['additional_data'] = '{}'
+
+        processed['raw_data_id'] = raw_data_id
+        processed['report_name'] = report_name
+        processed['report_date'] = flexible_date_parse(report_date)
+        processed['sheet_name'] = sheet_name
+        processed['original_line'] = original_lines if original_lines else list(range(1, len(df) + 1))
+
+        processed = processed.astype(object).where(processed.notna(), None)
+        return processed.to_dict('records'), []
+    except Exception as e:
+        logging.warning(f"Column-wise processing failed ({e}), reprocessing chunk row by row")
+        return process_chunk(chunk, field_mappings, default_mappings, raw_data_id, report_name, report_date,
+                             sheet_name, original_lines)
+
+def has_row_store(conn, raw_data_id):
+    """Checks if the report's rows were uploaded to raw_egypt_weekly_report_rows."""
     cursor = conn.cursor()
-    error_records = []
+    try:
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM raw_egypt_weekly_report_rows WHERE raw_data_id = %s
+            )
+        """, (raw_data_id,))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+def iter_row_store_chunks(conn, raw_data_id, chunk_size, start_after=0):
+    """Yields (original_lines, rows) chunks from raw_egypt_weekly_report_rows through a server-side cursor.
+
+    The cursor is declared WITH HOLD so the caller can commit between chunks.
+    """
+    cursor = conn.cursor(name=f"raw_rows_{raw_data_id}", withhold=True)
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute("""
+            SELECT original_line, row_data
+            FROM raw_egypt_weekly_report_rows
+            WHERE raw_data_id = %s AND original_line > %s
+            ORDER BY original_line
+        """, (raw_data_id, start_after))
+        while True:
+            records = cursor.fetchmany(chunk_size)
+            if not records:
+                break
+            yield [record[0] for record in records], [record[1] for record in records]
+    finally:
+        cursor.close()
+
+def iter_row_data_chunks(conn, raw_data_id, chunk_size, start_after=0):
+    """Yields (original_lines, rows) chunks of a row_data JSONB array through a server-side cursor.
+
+    The array is unnested on the server with jsonb_array_elements ... WITH ORDINALITY, so the
+    client only ever holds one chunk and original_line is the element's position in the array.
+    The cursor is declared WITH HOLD so the caller can commit between chunks.
+    """
+    cursor = conn.cursor(name=f"raw_row_data_{raw_data_id}", withhold=True)
+    cursor.itersize = chunk_size
+    try:
+        # Older uploads may hold the array as a JSON string; unwrap it before unnesting
+        cursor.execute("""
+            SELECT e.original_line, e.row
+            FROM raw_egypt_weekly_reports r
+            CROSS JOIN LATERAL jsonb_array_elements(
+                CASE jsonb_typeof(r.row_data)
+                    WHEN 'string' THEN (r.row_data #>> '{}')::jsonb
+                    ELSE r.row_data
+                END
+            ) WITH ORDINALITY AS e(row, original_line)
+            WHERE r.raw_data_id = %s AND e.original_line > %s
+            ORDER BY e.original_line
+        """, (raw_data_id, start_after))
+        while True:
+            records = cursor.fetchmany(chunk_size)
+            if not records:
+                break
+            yield [record[0] for record in records], [record[1] for record in records]
+    finally:
+        cursor.close()
+
+def get_checkpoint(conn, raw_data_id):
+    """Returns (last_original_line, chunks, rows, errors) committed by an earlier, unfinished run."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT last_original_line, chunks_committed, rows_processed, error_count
+            FROM preprocessing_progress
+            WHERE raw_data_id = %s
+        """, (raw_data_id,))
+        return cursor.fetchone() or (0, 0, 0, 0)
+    finally:
+        cursor.close()
+
+def discard_partial_run(cursor, raw_data_id):
+    """Deletes the rows, errors and checkpoint an unfinished run committed for a sheet."""
+    cursor.execute("""
+        DELETE FROM quality_checked_records q
+        USING preprocessed_egypt_weekly_data p
+        WHERE q.preprocessed_id = p.preprocessed_id AND p.raw_data_id = %s
+    """, (raw_data_id,))
+    for table in ("preprocessed_egypt_weekly_data", "preprocessing_errors", "preprocessing_progress"):
+        cursor.execute(f"DELETE FROM {table} WHERE raw_data_id = %s", (raw_data_id,))
+
+def save_checkpoint(cursor, raw_data_id, last_original_line, chunks, rows, errors):
+    """Records the last chunk written; committed together with that chunk's rows."""
+    cursor.execute("""
+        INSERT INTO preprocessing_progress
+            (raw_data_id, last_original_line, chunks_committed, rows_processed, error_count, updated_at)
+        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (raw_data_id) DO UPDATE SET
+            last_original_line = EXCLUDED.last_original_line,
+            chunks_committed = EXCLUDED.chunks_committed,
+            rows_processed = EXCLUDED.rows_processed,
+            error_count = EXCLUDED.error_count,
+            updated_at = EXCLUDED.updated_at
+    """, (raw_data_id, last_original_line, chunks, rows, errors))
+
+def preprocess_egypt_weekly_data(conn, raw_data_id, report_name, report_date, sheet_name,
+                                 write_method=DEFAULT_WRITE_METHOD, batch_size=DEFAULT_BATCH_SIZE,
+                                 use_default=None):
+    """Preprocesses one raw sheet and returns (rows processed, error count), or None if it was skipped.
+
+    Every chunk is committed with a checkpoint in preprocessing_progress, so after a failure
+    a rerun resumes with the first uncommitted chunk. use_default decides what happens when
+    the sheet has no field mappings: True uses the Default Mapping, False fails, and None
+    asks the user.
+    """
+    cursor = conn.cursor()
+    row_writer = BulkWriter(cursor, 'preprocessed_egypt_weekly_data', write_method, batch_size)
+    # Date formats are inferred per sheet; cached dates are kept per format
+    date_parser.reset_formats()
 
     logging.info(f"Starting preprocessing for raw_data_id: {raw_data_id}, report: {report_name}, date: {report_date}, sheet: {sheet_name}")
 
     try:
         # Check if already preprocessed
-        cursor.execute("SELECT preprocessed FROM raw_egypt_weekly_reports WHERE raw_data_id = %s", (raw_data_id,))
+        cursor.execute("SELECT preprocessed, superseded FROM raw_egypt_weekly_reports WHERE raw_data_id = %s", (raw_data_id,))
         result = cursor.fetchone()
         if result and result[0]:
             logging.info(f"Raw data with ID {raw_data_id} has already been preprocessed. Skipping.")
             return
+        if result and result[1]:
+            logging.info(f"Raw data with ID {raw_data_id} has been superseded by a newer version. Skipping.")
+            return
 
         if not check_field_mappings(conn, raw_data_id):
-            use_default = input("No field mappings found. Do you want to use the Default Mapping? (y/n): ").lower() == 'y'
+            if use_default is None:
+                use_default = input("No field mappings found. Do you want to use the Default Mapping? (y/n): ").lower() == 'y'
             if not use_default:
-                raise ValueError(f"No field mappings found for raw_data_id {raw_data_id}. "
+                raise MissingMappingsError(f"No field mappings found for raw_data_id {raw_data_id}. "
                                  "Please apply data mapping for this report/sheet before preprocessing.")
         
+        chunk_size = 1000
+
         cursor.execute("""
-            SELECT column_names, row_data
+            SELECT column_names, row_data IS NOT NULL
             FROM raw_egypt_weekly_reports
             WHERE raw_data_id = %s
         """, (raw_data_id,))
         raw_data = cursor.fetchone()
-
         if not raw_data:
             logging.warning(f"No data found for raw_data_id {raw_data_id}")
             return
-        
-        column_names, row_data = raw_data
 
+        column_names, has_row_data = raw_data
         logging.debug(f"Raw column_names: {column_names}")
-        logging.debug(f"Raw row_data type: {type(row_data)}")
-        logging.debug(f"Raw row_data sample: {str(row_data)[:1000]}")  # Log first 1000 characters
 
-        # Parse column names and row data
-        if isinstance(column_names, str):
-            column_names = json.loads(column_names)
-        
-        if isinstance(row_data, str):
-            json_data = json.loads(row_data)
-        elif isinstance(row_data, list):
-            json_data = row_data
+        # Resume after the last chunk committed by an earlier run, if any
+        last_line, chunk_count, total_processed, error_count = get_checkpoint(conn, raw_data_id)
+        if last_line:
+            print(f"Resuming after line {last_line} ({chunk_count} chunks, {total_processed} rows already committed)")
+            logging.info(f"Resuming raw_data_id {raw_data_id} after line {last_line}")
+
+        # Stream the rows with a server-side cursor, only one chunk is held in memory
+        if has_row_store(conn, raw_data_id):
+            chunks = iter_row_store_chunks(conn, raw_data_id, chunk_size, last_line)
+        elif has_row_data:
+            chunks = iter_row_data_chunks(conn, raw_data_id, chunk_size, last_line)
         else:
-            raise ValueError(f"Unexpected row_data type: {type(row_data)}")
-        
-        logging.debug(f"Parsed json_data type: {type(json_data)}")
-        logging.debug(f"Parsed json_data length: {len(json_data)}")
-        logging.debug(f"First row of json_data: {json_data[0] if json_data else 'Empty'}")
+            logging.warning(f"No data found for raw_data_id {raw_data_id}")
+            return
 
         # Fetch field mappings and default mappings
         field_mappings = get_field_mappings(conn, raw_data_id)
@@ -289,34 +593,34 @@ def preprocess_egypt_weekly_data(conn, raw_data_id, report_name, report_date, sh
         if not field_mappings and use_default:
             field_mappings = default_mappings
         
-        # Process data in chunks
-        chunk_size = 1000
-        total_processed = 0
-        for i in range(0, len(json_data), chunk_size):
-            chunk = json_data[i:i+chunk_size]
-            logging.debug(f"Processing chunk {i//chunk_size + 1}, size: {len(chunk)}")
-            processed_rows, chunk_errors = process_chunk(chunk, field_mappings, default_mappings, 
-                                                         raw_data_id, report_name, report_date, sheet_name)
+        # Process data in chunks; each chunk's rows, errors and checkpoint are committed together
+        for original_lines, chunk in chunks:
+            chunk_count += 1
+            logging.debug(f"Processing chunk {chunk_count}, size: {len(chunk)}")
+            processed_rows, chunk_errors = process_chunk_frame(chunk, field_mappings, default_mappings,
+                                                               raw_data_id, report_name, report_date, sheet_name,
+                                                               original_lines)
             
-            # Insert processed rows
             if processed_rows:
-                insert_processed_rows(cursor, processed_rows)
+                row_writer.write(processed_rows)
                 total_processed += len(processed_rows)
-            
-            # Accumulate errors
-            error_records.extend(chunk_errors)
-        
-        # Insert error records
-        if error_records:
-            insert_error_records(cursor, error_records)
+            if chunk_errors:
+                insert_error_records(cursor, chunk_errors, write_method, batch_size)
+                error_count += len(chunk_errors)
+
+            save_checkpoint(cursor, raw_data_id, original_lines[-1], chunk_count, total_processed, error_count)
+            conn.commit()
 
-        conn.commit()
         logging.info(f"Preprocessed {total_processed} rows for raw_data_id {raw_data_id}")
-        if error_records:
-            logging.warning(f"Encountered {len(error_records)} errors during preprocessing. See preprocessing_errors table for details.")
+        logging.info(f"Wrote {row_writer.summary()}")
+        logging.info(f"Date parser: {date_parser.stats()}")
+        if error_count:
+            logging.warning(f"Encountered {error_count} errors during preprocessing. See preprocessing_errors table for details.")
 
-        # Update preprocessed status
+        # Only the final chunk marks the sheet preprocessed; the checkpoint goes in the same commit
+        cursor.execute("DELETE FROM preprocessing_progress WHERE raw_data_id = %s", (raw_data_id,))
         update_preprocessed_status(conn, raw_data_id)
+        return total_processed, error_count
 
     except Exception as e:
         conn.rollback()
@@ -326,6 +630,68 @@ def preprocess_egypt_weekly_data(conn, raw_data_id, report_name, report_date, sh
     finally:
         cursor.close()
         
+def preprocess_egypt_weekly_data_sql(conn, raw_data_id, report_name, report_date, sheet_name, use_default=None):
+    """Preprocesses one raw sheet with a single server-side statement.
+
+    Same contract as preprocess_egypt_weekly_data: returns (rows processed, error count),
+    or None if the sheet was already preprocessed.
+    """
+    cursor = conn.cursor()
+
+    logging.info(f"Starting SQL preprocessing for raw_data_id: {raw_data_id}, report: {report_name}, date: {report_date}, sheet: {sheet_name}")
+
+    try:
+        cursor.execute("SELECT preprocessed, superseded FROM raw_egypt_weekly_reports WHERE raw_data_id = %s", (raw_data_id,))
+        result = cursor.fetchone()
+        if result and result[0]:
+            logging.info(f"Raw data with ID {raw_data_id} has already been preprocessed. Skipping.")
+            return
+        if result and result[1]:
+            logging.info(f"Raw data with ID {raw_data_id} has been superseded by a newer version. Skipping.")
+            return
+
+        if not check_field_mappings(conn, raw_data_id):
+            if use_default is None:
+                use_default = input("No field mappings found. Do you want to use the Default Mapping? (y/n): ").lower() == 'y'
+            if not use_default:
+                raise MissingMappingsError(f"No field mappings found for raw_data_id {raw_data_id}. "
+                                 "Please apply data mapping for this report/sheet before preprocessing.")
+
+        # The SQL engine writes the whole sheet, so rows committed by an interrupted Python run are
+        # removed first (in the same transaction) instead of being inserted a second time
+        last_line, chunks, _, _ = get_checkpoint(conn, raw_data_id)
+        if chunks:
+            logging.info(f"Discarding {chunks} chunks (up to line {last_line}) committed by an earlier run "
+                         f"for raw_data_id {raw_data_id}")
+            discard_partial_run(cursor, raw_data_id)
+
+        cursor.execute("SELECT processed_rows, error_rows FROM preprocess_egypt_weekly_sheet(%s, %s)",
+                       (raw_data_id, bool(use_default)))
+        total_processed, error_count = cursor.fetchone()
+        conn.commit()
+
+        logging.info(f"Preprocessed {total_processed} rows for raw_data_id {raw_data_id}")
+        logging.info(f"Wrote {total_processed} rows on the server")
+        if error_count:
+            logging.warning(f"Encountered {error_count} errors during preprocessing. See preprocessing_errors table for details.")
+        return total_processed, error_count
+
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error preprocessing data: {str(e)}")
+        logging.error(traceback.format_exc())
+        raise
+    finally:
+        cursor.close()
+
+def preprocess_sheet(conn, engine, raw_data_id, report_name, report_date, sheet_name,
+                     write_method=DEFAULT_WRITE_METHOD, batch_size=DEFAULT_BATCH_SIZE, use_default=None):
+    """Preprocesses one raw sheet with the selected engine."""
+    if engine == 'sql':
+        return preprocess_egypt_weekly_data_sql(conn, raw_data_id, report_name, report_date, sheet_name, use_default)
+    return preprocess_egypt_weekly_data(conn, raw_data_id, report_name, report_date, sheet_name,
+                                        write_method, batch_size, use_default)
+
 def update_preprocessed_status(conn, raw_data_id):
     """Updates the preprocessed status to True for the given raw_data_id."""
     cursor = conn.cursor()
@@ -343,14 +709,99 @@ def update_preprocessed_status(conn, raw_data_id):
     finally:
         cursor.close()
 
+def init_batch_worker():
+    """Opens the worker process's own connection, reused for every sheet it preprocesses."""
+    global worker_conn
+    worker_conn = psycopg2.connect(**DB_CONFIG)
+
+def preprocess_sheet_task(report, engine, write_method, batch_size, use_default):
+    """Batch worker task: preprocesses one sheet and returns its summary."""
+    raw_data_id, report_name, report_date, sheet_name = report
+    summary = {
+        'raw_data_id': raw_data_id,
+        'sheet': f"{report_name} - {report_date} - {sheet_name}",
+        'status': 'done',
+        'rows': 0,
+        'errors': 0,
+        'seconds': 0.0,
+        'message': ''
+    }
+    start = time.perf_counter()
+    try:
+        result = preprocess_sheet(worker_conn, engine, raw_data_id, report_name, report_date, sheet_name,
+                                  write_method, batch_size, use_default)
+        if result is None:
+            summary['status'] = 'skipped'
+        else:
+            summary['rows'], summary['errors'] = result
+    except MissingMappingsError as me:
+        summary['status'] = 'no mappings'
+        summary['message'] = str(me)
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['message'] = str(e)
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+def run_batch(workers, engine, write_method, batch_size, use_default):
+    """Preprocesses every raw sheet not preprocessed yet on a process pool and prints a summary."""
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        reports = get_available_reports(conn)
+    finally:
+        conn.close()
+
+    if not reports:
+        print("No reports waiting for preprocessing.")
+        return
+
+    print(f"Preprocessing {len(reports)} sheets with {workers} workers...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker) as executor:
+        summaries = list(executor.map(preprocess_sheet_task, reports,
+                                      [engine] * len(reports),
+                                      [write_method] * len(reports),
+                                      [batch_size] * len(reports),
+                                      [use_default] * len(reports)))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'ID':>6}  {'Status':<12}{'Rows':>8}{'Errors':>8}{'Seconds':>9}  Sheet")
+    for summary in summaries:
+        print(f"{summary['raw_data_id']:>6}  {summary['status']:<12}{summary['rows']:>8}{summary['errors']:>8}"
+              f"{summary['seconds']:>9.1f}  {summary['sheet']}")
+        if summary['message']:
+            print(f"{'':>8}{summary['message']}")
+        logging.info(f"Batch summary: {summary}")
+
+    total_rows = sum(summary['rows'] for summary in summaries)
+    done = sum(1 for summary in summaries if summary['status'] == 'done')
+    print(f"\n{done} of {len(summaries)} sheets preprocessed, {total_rows} rows in {elapsed:.1f}s "
+          f"({total_rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Preprocess raw Egypt weekly reports")
+    parser.add_argument("--engine", choices=["python", "sql"], default=DEFAULT_ENGINE,
+                        help="python: cast rows in this process; sql: one server-side preprocess_egypt_weekly_sheet() call")
+    parser.add_argument("--write-method", choices=["copy", "values"], default=DEFAULT_WRITE_METHOD,
+                        help="copy: COPY FROM STDIN; values: multi-row INSERT with execute_values")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Rows written per COPY/INSERT batch")
+    parser.add_argument("--batch", action="store_true",
+                        help="Preprocess every raw sheet not preprocessed yet, without prompts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes in batch mode, each with its own connection")
+    parser.add_argument("--mapping-policy", choices=["default", "explicit"], default="explicit",
+                        help="Batch mode, sheets without field mappings: 'default' uses the Default Mapping, "
+                             "'explicit' leaves them unprocessed")
+    return parser.parse_args()
+
 def main():
-    conn = psycopg2.connect(
-        dbname="ReportsDB",
-        user="postgres",
-        password="123456",
-        host="cmms-db-01",
-        port="5432"
-    )
+    args = parse_args()
+    if args.batch:
+        run_batch(args.workers, args.engine, args.write_method, args.batch_size, args.mapping_policy == "default")
+        return
+
+    conn = psycopg2.connect(**DB_CONFIG)
     try:
         while True:
             selected_report = select_report(conn)
@@ -360,10 +811,11 @@ def main():
             
             raw_data_id, report_name, report_date, sheet_name = selected_report
             try:
-                preprocess_egypt_weekly_data(conn, raw_data_id, report_name, report_date, sheet_name)
+                preprocess_sheet(conn, args.engine, raw_data_id, report_name, report_date, sheet_name,
+                                 args.write_method, args.batch_size)
                 print(f"Preprocessing completed for raw_data_id {raw_data_id}")
-            except ValueError as ve:
-                print(f"Error: {str(ve)}")
+            except MissingMappingsError as me:
+                print(f"Error: {str(me)}")
             except Exception as e:
                 print(f"An error occurred during preprocessing: {str(e)}")
                 logging.error("Traceback:", exc_info=True)
@@ -375,6 +827,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
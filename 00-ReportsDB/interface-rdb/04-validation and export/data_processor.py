@@ -1,49 +1,219 @@
 # data_processor.py
 
 import psycopg2
+from psycopg2 import pool
 from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import argparse
+import threading
+import time
 import json
 import re
 
+# Connections kept per database config; all DataProcessor methods borrow from these pools
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 8
+
+# Sheets quality-checked at once by process_report; each worker borrows its own pooled connection
+DEFAULT_SHEET_WORKERS = 1
+
+# Fields that must all be filled in for check_details_match
+CRITICAL_FIELDS = ['nomenclature', 'niin', 'part_no', 'apl', 'cog', 'fsc', 'qty', 'ui']
+
+# Fingerprint of the fields a quality check reads. The row-level check results are kept per
+# fingerprint in quality_result_cache, which is not cleared by export_and_cleanup, so a record
+# whose content was checked before (also under an earlier preprocessed_id) is not re-checked.
+# Duplicate status depends on the whole sheet and is always re-evaluated.
+ROW_FINGERPRINT_SQL = """
+    md5(ROW(jcn, twcode, additional_data -> 'suffix', nomenclature, niin, part_no,
+            apl, cog, fsc, qty, ui)::TEXT)
+"""
+
+# Check-and-score for one sheet in a single statement; same rules and scores as process_sheet_python.
+# Records whose fingerprint and duplicate status match their stored result are left alone; the others
+# take their row-level results from quality_result_cache and only unseen fingerprints are checked.
+# Returns (records in sheet, records re-checked).
+QUALITY_CHECK_SQL = f"""
+    WITH sheet_records AS (
+        SELECT
+            p.*,
+            {ROW_FINGERPRINT_SQL} AS row_fingerprint,
+            ROW_NUMBER() OVER (PARTITION BY jcn, twcode ORDER BY preprocessed_id) > 1 AS has_duplicates
+        FROM preprocessed_egypt_weekly_data p
+        WHERE report_name = %(report_name)s AND report_date = %(report_date)s AND sheet_name = %(sheet_name)s
+    ),
+    pending AS (
+        SELECT r.*
+        FROM sheet_records r
+        LEFT JOIN quality_checked_records q ON q.preprocessed_id = r.preprocessed_id
+        WHERE q.preprocessed_id IS NULL
+           OR q.row_fingerprint IS DISTINCT FROM r.row_fingerprint
+           OR q.has_duplicates IS DISTINCT FROM r.has_duplicates
+    ),
+    computed AS (
+        SELECT DISTINCT ON (r.row_fingerprint)
+            r.row_fingerprint,
+            COALESCE(r.jcn ~ '^[A-Z0-9-]+$' AND r.twcode ~ '^[A-Z0-9]+$', FALSE) AS jcn_twcode_valid,
+            COALESCE(r.additional_data ? 'suffix' AND r.additional_data ->> 'suffix' IS NOT NULL, FALSE) AS suffix_check_result,
+            (COALESCE(r.nomenclature, '') <> '' AND COALESCE(r.niin, '') <> '' AND COALESCE(r.part_no, '') <> ''
+             AND COALESCE(r.apl, '') <> '' AND COALESCE(r.cog, '') <> '' AND COALESCE(r.fsc, '') <> ''
+             AND COALESCE(r.qty, 0) <> 0 AND COALESCE(r.ui, '') <> '') AS details_match_result
+        FROM pending r
+        WHERE NOT EXISTS (SELECT 1 FROM quality_result_cache c WHERE c.row_fingerprint = r.row_fingerprint)
+        ORDER BY r.row_fingerprint
+    ),
+    cached AS (
+        INSERT INTO quality_result_cache (row_fingerprint, jcn_twcode_valid, suffix_check_result, details_match_result)
+        SELECT row_fingerprint, jcn_twcode_valid, suffix_check_result, details_match_result
+        FROM computed
+        ON CONFLICT (row_fingerprint) DO NOTHING
+    ),
+    results AS (
+        SELECT row_fingerprint, jcn_twcode_valid, suffix_check_result, details_match_result, FALSE AS rechecked
+        FROM quality_result_cache
+        WHERE row_fingerprint IN (SELECT row_fingerprint FROM pending)
+        UNION ALL
+        SELECT row_fingerprint, jcn_twcode_valid, suffix_check_result, details_match_result, TRUE
+        FROM computed
+    ),
+    checks AS (
+        SELECT
+            p.preprocessed_id,
+            p.row_fingerprint,
+            res.jcn_twcode_valid,
+            res.suffix_check_result,
+            res.details_match_result,
+            p.has_duplicates,
+            res.rechecked
+        FROM pending p
+        JOIN results res ON res.row_fingerprint = p.row_fingerprint
+    ),
+    upserted AS (
+        INSERT INTO quality_checked_records
+        (preprocessed_id, overall_quality_score, data_integrity_score, consistency_score,
+        completeness_score, jcn_twcode_valid, suffix_check_result, details_match_result,
+        has_duplicates, check_details, row_fingerprint)
+        SELECT
+            preprocessed_id,
+            (jcn_twcode_valid::INT + (NOT suffix_check_result)::INT + details_match_result::INT
+             + (NOT has_duplicates)::INT) / 4.0 * 100,
+            (jcn_twcode_valid::INT + (NOT suffix_check_result)::INT) / 2.0 * 100,
+            details_match_result::INT * 100,
+            (NOT has_duplicates)::INT * 100,
+            jcn_twcode_valid,
+            suffix_check_result,
+            details_match_result,
+            has_duplicates,
+            jsonb_build_object(
+                'jcn_twcode_check', CASE WHEN jcn_twcode_valid THEN 'Valid' ELSE 'Invalid' END,
+                'suffix_check', CASE WHEN suffix_check_result THEN 'Needs review' ELSE 'OK' END,
+                'details_match', CASE WHEN details_match_result THEN 'Matched' ELSE 'Mismatched' END,
+                'duplicate_status', CASE WHEN has_duplicates THEN 'Duplicate found' ELSE 'No duplicates' END
+            ),
+            row_fingerprint
+        FROM checks
+        ON CONFLICT (preprocessed_id) DO UPDATE SET
+            overall_quality_score = EXCLUDED.overall_quality_score,
+            data_integrity_score = EXCLUDED.data_integrity_score,
+            consistency_score = EXCLUDED.consistency_score,
+            completeness_score = EXCLUDED.completeness_score,
+            jcn_twcode_valid = EXCLUDED.jcn_twcode_valid,
+            suffix_check_result = EXCLUDED.suffix_check_result,
+            details_match_result = EXCLUDED.details_match_result,
+            has_duplicates = EXCLUDED.has_duplicates,
+            check_details = EXCLUDED.check_details,
+            row_fingerprint = EXCLUDED.row_fingerprint,
+            last_updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT (SELECT COUNT(*) FROM sheet_records), (SELECT COUNT(*) FROM checks WHERE rechecked)
+"""
+
+# Upsert key of staged_egypt_weekly_data (unique index idx_staged_egypt_weekly_data_record_key)
+STAGED_RECORD_KEY = "report_name, report_date, sheet_name, original_line, COALESCE(system_identifier_code, '')"
+STAGED_KEY_COLUMNS = ['report_name', 'report_date', 'sheet_name', 'original_line', 'system_identifier_code']
+
+JCN_PATTERN = re.compile(r'^[A-Z0-9-]+$')
+TWCODE_PATTERN = re.compile(r'^[A-Z0-9]+$')
+
 class DataProcessor:
-    def __init__(self, source_db_config, target_db_config):
+    def __init__(self, source_db_config, target_db_config, use_sql_checks=True, export_method='server'):
         self.source_db_config = source_db_config
         self.target_db_config = target_db_config
-
-    def connect_to_db(self, config):
-        return psycopg2.connect(**config)
-
-    def get_preprocessed_reports(self):
-        conn = self.connect_to_db(self.source_db_config)
-        cursor = conn.cursor()
+        # Run the quality checks as one SQL statement per sheet; the Python checks are the fallback
+        self.use_sql_checks = use_sql_checks
+        # server: ExtLogDB pulls the sheet over dblink (import_staged_egypt_weekly_sheet);
+        # client: rows are fetched here and inserted into ExtLogDB
+        self.export_method = export_method
+        self.pools = {}
+        self.pools_lock = threading.Lock()
+
+    def get_pool(self, config):
+        """Returns the connection pool for a database config, creating it on first use."""
+        key = tuple(sorted(config.items()))
+        with self.pools_lock:
+            if key not in self.pools:
+                self.pools[key] = pool.ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **config)
+            return self.pools[key]
+
+    @contextmanager
+    def connection(self, config):
+        """Borrows a pooled connection; it goes back to the pool with no transaction left open."""
+        db_pool = self.get_pool(config)
+        conn = db_pool.getconn()
         try:
-            cursor.execute("""
-                SELECT DISTINCT r.report_name, r.report_date
-                FROM raw_egypt_weekly_reports r
-                JOIN preprocessed_egypt_weekly_data p
-                ON r.report_name = p.report_name AND r.report_date = p.report_date
-                WHERE r.preprocessed = TRUE
-                ORDER BY r.report_date DESC, r.report_name
-            """)
-            return cursor.fetchall()
+            yield conn
         finally:
-            cursor.close()
-            conn.close()
+            if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+            db_pool.putconn(conn, close=bool(conn.closed))
+
+    @contextmanager
+    def transaction(self, config):
+        """Borrows a pooled connection for one transaction: commits on success, rolls back on error."""
+        with self.connection(config) as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close_pools(self):
+        with self.pools_lock:
+            for db_pool in self.pools.values():
+                db_pool.closeall()
+            self.pools.clear()
+
+    def get_preprocessed_reports(self):
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT DISTINCT r.report_name, r.report_date
+                    FROM raw_egypt_weekly_reports r
+                    JOIN preprocessed_egypt_weekly_data p
+                    ON r.report_name = p.report_name AND r.report_date = p.report_date
+                    WHERE r.preprocessed = TRUE AND NOT r.superseded
+                    ORDER BY r.report_date DESC, r.report_name
+                """)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
 
     def get_preprocessed_sheets(self, report_name, report_date):
-        conn = self.connect_to_db(self.source_db_config)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT DISTINCT sheet_name
-                FROM preprocessed_egypt_weekly_data
-                WHERE report_name = %s AND report_date = %s
-                ORDER BY sheet_name
-            """, (report_name, report_date))
-            return cursor.fetchall()
-        finally:
-            cursor.close()
-            conn.close()
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT DISTINCT sheet_name
+                    FROM preprocessed_egypt_weekly_data
+                    WHERE report_name = %s AND report_date = %s
+                    ORDER BY sheet_name
+                """, (report_name, report_date))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
 
     def select_report_and_sheet(self):
         reports = self.get_preprocessed_reports()
@@ -93,19 +263,50 @@ class DataProcessor:
         return selected_report, selected_sheets
 
     def fetch_preprocessed_data(self, report_name, report_date, sheet_name):
-        conn = self.connect_to_db(self.source_db_config)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT *
-                FROM preprocessed_egypt_weekly_data
-                WHERE report_name = %s AND report_date = %s AND sheet_name = %s
-            """, (report_name, report_date, sheet_name))
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
-        finally:
-            cursor.close()
-            conn.close()
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    SELECT *, {ROW_FINGERPRINT_SQL} AS row_fingerprint
+                    FROM preprocessed_egypt_weekly_data
+                    WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+                    ORDER BY preprocessed_id
+                """, (report_name, report_date, sheet_name))
+                columns = [desc[0] for desc in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def fetch_stored_checks(self, report_name, report_date, sheet_name):
+        """Returns {preprocessed_id: (row_fingerprint, has_duplicates)} of the sheet's stored quality results."""
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT q.preprocessed_id, q.row_fingerprint, q.has_duplicates
+                    FROM quality_checked_records q
+                    JOIN preprocessed_egypt_weekly_data p ON p.preprocessed_id = q.preprocessed_id
+                    WHERE p.report_name = %s AND p.report_date = %s AND p.sheet_name = %s
+                """, (report_name, report_date, sheet_name))
+                return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+
+    def fetch_cached_results(self, fingerprints):
+        """Returns {row_fingerprint: (jcn_twcode_valid, suffix_check_result, details_match_result)} from quality_result_cache."""
+        if not fingerprints:
+            return {}
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT row_fingerprint, jcn_twcode_valid, suffix_check_result, details_match_result
+                    FROM quality_result_cache
+                    WHERE row_fingerprint = ANY(%s)
+                """, (list(fingerprints),))
+                return {row[0]: row[1:] for row in cursor.fetchall()}
+            finally:
+                cursor.close()
 
     def check_jcn_twcode(self, record):
         jcn = record.get('jcn')
@@ -114,10 +315,7 @@ class DataProcessor:
         if not jcn or not twcode:
             return False
         
-        jcn_pattern = r'^[A-Z0-9-]+$'
-        twcode_pattern = r'^[A-Z0-9]+$'
-        
-        return bool(re.match(jcn_pattern, jcn)) and bool(re.match(twcode_pattern, twcode))
+        return bool(JCN_PATTERN.match(jcn)) and bool(TWCODE_PATTERN.match(twcode))
 
     def check_suffix(self, record):
         additional_data = record.get('additional_data', {})
@@ -129,8 +327,7 @@ class DataProcessor:
         return additional_data.get('suffix') is not None
 
     def check_details_match(self, record):
-        critical_fields = ['nomenclature', 'niin', 'part_no', 'apl', 'cog', 'fsc', 'quantity', 'ui']
-        return all(record.get(field) for field in critical_fields)
+        return all(record.get(field) for field in CRITICAL_FIELDS)
 
     def check_duplicates(self, records):
         seen = set()
@@ -160,65 +357,119 @@ class DataProcessor:
             })
         return scores
 
-    def update_quality_checked_records(self, check_results):
-        conn = self.connect_to_db(self.source_db_config)
-        cursor = conn.cursor()
-        try:
-            execute_values(cursor, """
-                INSERT INTO quality_checked_records
-                (preprocessed_id, overall_quality_score, data_integrity_score, consistency_score, 
-                completeness_score, jcn_twcode_valid, suffix_check_result, details_match_result, 
-                has_duplicates, check_details)
-                VALUES %s
-                ON CONFLICT (preprocessed_id) DO UPDATE SET
-                    overall_quality_score = EXCLUDED.overall_quality_score,
-                    data_integrity_score = EXCLUDED.data_integrity_score,
-                    consistency_score = EXCLUDED.consistency_score,
-                    completeness_score = EXCLUDED.completeness_score,
-                    jcn_twcode_valid = EXCLUDED.jcn_twcode_valid,
-                    suffix_check_result = EXCLUDED.suffix_check_result,
-                    details_match_result = EXCLUDED.details_match_result,
-                    has_duplicates = EXCLUDED.has_duplicates,
-                    check_details = EXCLUDED.check_details,
-                    last_updated_at = CURRENT_TIMESTAMP
-            """, [
-                (
-                    result['preprocessed_id'],
-                    result['overall_quality_score'],
-                    result['data_integrity_score'],
-                    result['consistency_score'],
-                    result['completeness_score'],
-                    result['jcn_twcode_valid'],
-                    result['suffix_check_result'],
-                    result['details_match_result'],
-                    result['has_duplicates'],
-                    json.dumps(result['check_details'])
-                ) for result in check_results
-            ])
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error updating quality checked records: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+    def update_quality_checked_records(self, check_results, new_results=()):
+        """Writes the sheet's check results, and the newly computed (fingerprint, checks...) rows to quality_result_cache."""
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                if new_results:
+                    execute_values(cursor, """
+                        INSERT INTO quality_result_cache
+                        (row_fingerprint, jcn_twcode_valid, suffix_check_result, details_match_result)
+                        VALUES %s
+                        ON CONFLICT (row_fingerprint) DO NOTHING
+                    """, new_results)
+                execute_values(cursor, """
+                    INSERT INTO quality_checked_records
+                    (preprocessed_id, overall_quality_score, data_integrity_score, consistency_score, 
+                    completeness_score, jcn_twcode_valid, suffix_check_result, details_match_result, 
+                    has_duplicates, check_details, row_fingerprint)
+                    VALUES %s
+                    ON CONFLICT (preprocessed_id) DO UPDATE SET
+                        overall_quality_score = EXCLUDED.overall_quality_score,
+                        data_integrity_score = EXCLUDED.data_integrity_score,
+                        consistency_score = EXCLUDED.consistency_score,
+                        completeness_score = EXCLUDED.completeness_score,
+                        jcn_twcode_valid = EXCLUDED.jcn_twcode_valid,
+                        suffix_check_result = EXCLUDED.suffix_check_result,
+                        details_match_result = EXCLUDED.details_match_result,
+                        has_duplicates = EXCLUDED.has_duplicates,
+                        check_details = EXCLUDED.check_details,
+                        row_fingerprint = EXCLUDED.row_fingerprint,
+                        last_updated_at = CURRENT_TIMESTAMP
+                """, [
+                    (
+                        result['preprocessed_id'],
+                        result['overall_quality_score'],
+                        result['data_integrity_score'],
+                        result['consistency_score'],
+                        result['completeness_score'],
+                        result['jcn_twcode_valid'],
+                        result['suffix_check_result'],
+                        result['details_match_result'],
+                        result['has_duplicates'],
+                        json.dumps(result['check_details']),
+                        result.get('row_fingerprint')
+                    ) for result in check_results
+                ])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error updating quality checked records: {e}")
+            finally:
+                cursor.close()
 
     def process_sheet(self, report_name, report_date, sheet_name):
+        """Quality-checks and scores one sheet; returns (records in sheet, records re-checked).
+
+        Records whose row fingerprint and duplicate status match their stored result are left as they are;
+        the row-level checks of any fingerprint already in quality_result_cache are reused.
+        """
+        if self.use_sql_checks:
+            try:
+                return self.process_sheet_sql(report_name, report_date, sheet_name)
+            except psycopg2.Error as e:
+                print(f"SQL quality checks failed ({e}), falling back to Python checks")
+        return self.process_sheet_python(report_name, report_date, sheet_name)
+
+    def process_sheet_sql(self, report_name, report_date, sheet_name):
+        with self.transaction(self.source_db_config) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(QUALITY_CHECK_SQL, {
+                    'report_name': report_name,
+                    'report_date': report_date,
+                    'sheet_name': sheet_name
+                })
+                total, recomputed = cursor.fetchone()
+        print(f"Processed {total} records for {sheet_name} ({recomputed} recomputed, {total - recomputed} reused)")
+        return total, recomputed
+
+    def process_sheet_python(self, report_name, report_date, sheet_name):
         records = self.fetch_preprocessed_data(report_name, report_date, sheet_name)
-        check_results = []
+        stored_checks = self.fetch_stored_checks(report_name, report_date, sheet_name)
+
+        # Duplicates depend on the whole sheet, so they are always evaluated for every record
+        duplicate_check = self.check_duplicates(records)
 
+        pending = []
         for record in records:
-            result = {
-                'preprocessed_id': record['preprocessed_id'],
-                'jcn_twcode_valid': self.check_jcn_twcode(record),
-                'suffix_check_result': self.check_suffix(record),
-                'details_match_result': self.check_details_match(record),
-            }
-            check_results.append(result)
+            has_duplicates = duplicate_check.get(record['preprocessed_id'], False)
+            if stored_checks.get(record['preprocessed_id']) != (record['row_fingerprint'], has_duplicates):
+                pending.append((record, has_duplicates))
 
-        duplicate_check = self.check_duplicates(records)
-        for result in check_results:
-            result['has_duplicates'] = duplicate_check.get(result['preprocessed_id'], False)
+        cached_results = self.fetch_cached_results({record['row_fingerprint'] for record, _ in pending})
+        new_results = {}
+        check_results = []
+        rechecked = 0
+        for record, has_duplicates in pending:
+            fingerprint = record['row_fingerprint']
+            checks = cached_results.get(fingerprint) or new_results.get(fingerprint)
+            if checks is None:
+                checks = new_results[fingerprint] = (
+                    self.check_jcn_twcode(record),
+                    self.check_suffix(record),
+                    self.check_details_match(record)
+                )
+            if fingerprint in new_results:
+                rechecked += 1
+            check_results.append({
+                'preprocessed_id': record['preprocessed_id'],
+                'row_fingerprint': fingerprint,
+                'jcn_twcode_valid': checks[0],
+                'suffix_check_result': checks[1],
+                'details_match_result': checks[2],
+                'has_duplicates': has_duplicates,
+            })
 
         scores = self.calculate_scores(check_results)
         for result, score in zip(check_results, scores):
@@ -230,119 +481,183 @@ class DataProcessor:
                 'duplicate_status': "Duplicate found" if result['has_duplicates'] else "No duplicates"
             }
 
-        self.update_quality_checked_records(check_results)
-        print(f"Processed {len(check_results)} records for {sheet_name}")
-        return check_results
+        if check_results:
+            self.update_quality_checked_records(
+                check_results, [(fingerprint, *checks) for fingerprint, checks in new_results.items()]
+            )
+        total, recomputed = len(records), rechecked
+        print(f"Processed {total} records for {sheet_name} ({recomputed} recomputed, {total - recomputed} reused)")
+        return total, recomputed
 
     def export_to_external_db(self, data):
-        conn = self.connect_to_db(self.target_db_config)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("BEGIN")
-            
-            # Get the column names of the staged_egypt_weekly_data table, excluding staged_id
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'staged_egypt_weekly_data'
-                AND column_name != 'staged_id'
-                ORDER BY ordinal_position
-            """)
-            target_columns = [row[0] for row in cursor.fetchall()]
+        """Upserts rows into staged_egypt_weekly_data in one ExtLogDB transaction; raises on failure."""
+        if not data:
+            return
+        with self.transaction(self.target_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                # Get the column names of the staged_egypt_weekly_data table, excluding staged_id
+                cursor.execute("""
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name = 'staged_egypt_weekly_data'
+                    AND column_name != 'staged_id'
+                    ORDER BY ordinal_position
+                """)
+                # Only columns the export provides, so matching state keeps its defaults and is not overwritten
+                target_columns = [row[0] for row in cursor.fetchall() if row[0] in data[0]]
             
-            insert_data = []
-            for row in data:
-                row_data = []
-                for column in target_columns:
-                    value = row.get(column)
-                    if isinstance(value, (dict, list)):
-                        value = json.dumps(value)
-                    row_data.append(value)
-                insert_data.append(tuple(row_data))
-
-            columns_string = ', '.join(target_columns)
-            placeholders = ', '.join(['%s'] * len(target_columns))
+                # One row per record key, the latest (highest preprocessed_id) winning like the server
+                # path's DISTINCT ON; ON CONFLICT cannot update the same row twice in one statement
+                latest_rows = {}
+                for row in sorted(data, key=lambda row: row.get('preprocessed_id') or 0):
+                    key = tuple(row.get(column) for column in STAGED_KEY_COLUMNS[:-1]) + \
+                          (row.get('system_identifier_code') or '',)
+                    latest_rows[key] = row
+
+                insert_data = []
+                for row in latest_rows.values():
+                    row_data = []
+                    for column in target_columns:
+                        value = row.get(column)
+                        if isinstance(value, (dict, list)):
+                            value = json.dumps(value)
+                        row_data.append(value)
+                    insert_data.append(tuple(row_data))
+
+                columns_string = ', '.join(target_columns)
+                updates_string = ', '.join(f"{column} = EXCLUDED.{column}" for column in target_columns
+                                           if column not in STAGED_KEY_COLUMNS)
             
-            cursor.executemany(f"""
-                INSERT INTO staged_egypt_weekly_data ({columns_string})
-                VALUES ({placeholders})
-            """, insert_data)
-
-            cursor.execute("COMMIT")
-            print(f"Successfully exported {len(data)} records to ExtLogDB")
-        except Exception as e:
-            cursor.execute("ROLLBACK")
-            print(f"Error exporting to ExtLogDB: {str(e)}")
-        finally:
-            cursor.close()
-            conn.close()
+                # Re-exporting a sheet updates its staged rows instead of duplicating them
+                execute_values(cursor, f"""
+                    INSERT INTO staged_egypt_weekly_data ({columns_string})
+                    VALUES %s
+                    ON CONFLICT ({STAGED_RECORD_KEY}) DO UPDATE SET {updates_string}
+                """, insert_data, page_size=len(insert_data))
+
+            except Exception as e:
+                print(f"Error exporting to ExtLogDB: {str(e)}")
+                raise
+            finally:
+                cursor.close()
+        print(f"Successfully exported {len(data)} records to ExtLogDB")
+
+    def export_sheet_server_side(self, report_name, report_date, sheet_name):
+        """Has ExtLogDB pull one sheet from ReportsDB over dblink and upsert it; no rows pass through this process."""
+        with self.transaction(self.target_db_config) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT import_staged_egypt_weekly_sheet(%s, %s, %s)",
+                               (report_name, report_date, sheet_name))
+                count = cursor.fetchone()[0]
+        print(f"Successfully exported {count} records to ExtLogDB")
+        return count
 
     def export_and_cleanup(self, report_name, report_date, sheet_name):
-        conn = self.connect_to_db(self.source_db_config)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("BEGIN")
-
-            # Fetch data
-            cursor.execute("""
-                SELECT p.*, q.overall_quality_score, q.data_integrity_score, 
-                       q.consistency_score, q.completeness_score, q.check_details
-                FROM preprocessed_egypt_weekly_data p
-                LEFT JOIN quality_checked_records q ON p.preprocessed_id = q.preprocessed_id
-                WHERE p.report_name = %s AND p.report_date = %s AND p.sheet_name = %s
-            """, (report_name, report_date, sheet_name))
+        with self.connection(self.source_db_config) as conn:
+            cursor = conn.cursor()
+            try:
+                if self.export_method == 'server':
+                    self.export_sheet_server_side(report_name, report_date, sheet_name)
+                else:
+                    # Fetch data
+                    cursor.execute("""
+                        SELECT p.*, q.overall_quality_score, q.data_integrity_score, 
+                               q.consistency_score, q.completeness_score, q.check_details
+                        FROM preprocessed_egypt_weekly_data p
+                        LEFT JOIN quality_checked_records q ON p.preprocessed_id = q.preprocessed_id
+                        WHERE p.report_name = %s AND p.report_date = %s AND p.sheet_name = %s
+                    """, (report_name, report_date, sheet_name))
             
-            data = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            data = [dict(zip(columns, row)) for row in data]
-
-            # Export data
-            self.export_to_external_db(data)
-
-            # Cleanup - delete from quality_checked_records first
-            cursor.execute("""
-                DELETE FROM quality_checked_records
-                WHERE preprocessed_id IN (
-                    SELECT preprocessed_id
-                    FROM preprocessed_egypt_weekly_data
-                    WHERE report_name = %s AND report_date = %s AND sheet_name = %s
-                )
-            """, (report_name, report_date, sheet_name))
+                    data = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    data = [dict(zip(columns, row)) for row in data]
+
+                    # Export data
+                    self.export_to_external_db(data)
+
+                # Cleanup - delete from quality_checked_records first
+                cursor.execute("""
+                    DELETE FROM quality_checked_records
+                    WHERE preprocessed_id IN (
+                        SELECT preprocessed_id
+                        FROM preprocessed_egypt_weekly_data
+                        WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+                    )
+                """, (report_name, report_date, sheet_name))
             
-            # Then delete from preprocessed_egypt_weekly_data
-            cursor.execute("""
-                DELETE FROM preprocessed_egypt_weekly_data
-                WHERE report_name = %s AND report_date = %s AND sheet_name = %s
-            """, (report_name, report_date, sheet_name))
+                # Then delete from preprocessed_egypt_weekly_data
+                cursor.execute("""
+                    DELETE FROM preprocessed_egypt_weekly_data
+                    WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+                """, (report_name, report_date, sheet_name))
             
-            cursor.execute("""
-                UPDATE raw_egypt_weekly_reports
-                SET preprocessed = TRUE, exported = TRUE
-                WHERE report_name = %s AND report_date = %s AND sheet_name = %s
-            """, (report_name, report_date, sheet_name))
+                cursor.execute("""
+                    UPDATE raw_egypt_weekly_reports
+                    SET preprocessed = TRUE, exported = TRUE
+                    WHERE report_name = %s AND report_date = %s AND sheet_name = %s
+                """, (report_name, report_date, sheet_name))
             
-            cursor.execute("COMMIT")
-            print(f"Successfully exported and cleaned up data for report {report_name} dated {report_date}, sheet {sheet_name}")
+                conn.commit()
+                print(f"Successfully exported and cleaned up data for report {report_name} dated {report_date}, sheet {sheet_name}")
+                return True
+            except Exception as e:
+                conn.rollback()
+                print(f"Error in export and cleanup process: {str(e)}")
+                return False
+            finally:
+                cursor.close()
+
+    def check_sheet_task(self, report_name, report_date, sheet_name):
+        """Quality-checks one sheet for process_report; returns its summary."""
+        start = time.perf_counter()
+        summary = {'sheet': sheet_name, 'status': 'checked', 'records': 0, 'recomputed': 0,
+                   'check_seconds': 0.0, 'export_seconds': 0.0}
+        try:
+            summary['records'], summary['recomputed'] = self.process_sheet(report_name, report_date, sheet_name)
         except Exception as e:
-            cursor.execute("ROLLBACK")
-            print(f"Error in export and cleanup process: {str(e)}")
-        finally:
-            cursor.close()
-            conn.close()
-
-    def process_report(self):
+            print(f"Error checking sheet {sheet_name}: {str(e)}")
+            summary['status'] = 'check failed'
+        summary['check_seconds'] = time.perf_counter() - start
+        return summary
+
+    def print_summary(self, summaries, elapsed):
+        print(f"\n{'Sheet':<30}{'Status':<15}{'Records':>9}{'Rescored':>10}{'Check s':>9}{'Export s':>10}")
+        for summary in summaries:
+            print(f"{summary['sheet'][:29]:<30}{summary['status']:<15}{summary['records']:>9}{summary['recomputed']:>10}"
+                  f"{summary['check_seconds']:>9.1f}{summary['export_seconds']:>10.1f}")
+        exported = sum(1 for summary in summaries if summary['status'] == 'exported')
+        print(f"{exported} of {len(summaries)} sheets exported in {elapsed:.1f}s")
+
+    def process_report(self, workers=DEFAULT_SHEET_WORKERS):
+        """Quality-checks the selected sheets, up to `workers` at a time, and exports them one by one in sheet order."""
         selected_report, selected_sheets = self.select_report_and_sheet()
         if selected_report is None or selected_sheets is None:
             print("No report or sheets selected. Exiting.")
             return
 
         report_name, report_date = selected_report
-
-        for sheet_name in selected_sheets:
-            print(f"Processing sheet: {sheet_name}")
-            check_results = self.process_sheet(report_name, report_date, sheet_name)
-            self.export_and_cleanup(report_name, report_date, sheet_name)
-
+        # Leave room in the pool for the export's own ReportsDB connection
+        workers = max(1, min(workers, len(selected_sheets), POOL_MAX_CONNECTIONS - 1))
+        start = time.perf_counter()
+        summaries = []
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.check_sheet_task, report_name, report_date, sheet_name)
+                       for sheet_name in selected_sheets]
+
+            # Single writer: sheets are exported in selection order as their checks finish
+            for sheet_name, future in zip(selected_sheets, futures):
+                summary = future.result()
+                if summary['status'] == 'checked':
+                    print(f"Exporting sheet: {sheet_name}")
+                    export_start = time.perf_counter()
+                    exported = self.export_and_cleanup(report_name, report_date, sheet_name)
+                    summary['export_seconds'] = time.perf_counter() - export_start
+                    summary['status'] = 'exported' if exported else 'export failed'
+                summaries.append(summary)
+
+        self.print_summary(summaries, time.perf_counter() - start)
         print("Processing completed.")
 
 # Usage
@@ -361,5 +676,13 @@ if __name__ == "__main__":
         "host": "cmms-db-01",
         "port": "5432"
     }
+    parser = argparse.ArgumentParser(description="Quality-check preprocessed sheets and export them to ExtLogDB")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SHEET_WORKERS,
+                        help="Sheets quality-checked in parallel; exports always run one sheet at a time")
+    args = parser.parse_args()
+
     processor = DataProcessor(source_db_config, target_db_config)
-    processor.process_report()
\ No newline at end of file
+    try:
+        processor.process_report(args.workers)
+    finally:
+        processor.close_pools()
\ No newline at end of file
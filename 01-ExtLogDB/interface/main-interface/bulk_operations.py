@@ -6,6 +6,10 @@ import numpy as np
 import math
 from datetime import datetime, date
 from config import FIELD_MAX_LENGTHS
+from date_parser import DateParser
+
+# Memoized date parser shared by MRL and fulfillment imports
+date_parser = DateParser()
 
 def clean_data(obj):
     """
@@ -54,14 +58,12 @@ def prepare_mrl_data(data_frame):
     )
     logging.debug("Column names cleaned and standardized.")
 
-    # Handle date fields
+    # Handle date fields; their formats are inferred per DataFrame
+    date_parser.reset_formats()
     date_columns = ['request_date', 'rdd']
     for col in date_columns:
         if col in data_frame.columns:
-            data_frame[col] = pd.to_datetime(
-                data_frame[col],
-                errors='coerce'
-            ).dt.date  # Extract date component
+            data_frame[col] = date_parser.parse_series(data_frame[col], col)  # Extract date component
             logging.debug(f"Date field '{col}' processed.")
 
     # Convert numeric columns to appropriate data types
@@ -101,17 +103,15 @@ def prepare_fulfillment_data(data_frame):
     )
     logging.debug("Column names cleaned and standardized.")
 
-    # Handle date fields
+    # Handle date fields; their formats are inferred per DataFrame
+    date_parser.reset_formats()
     date_columns = [
         'sail_date', 'edd_to_ches', 'edd_egypt', 'rcd_v2x_date',
         'lsc_on_hand_date', 'arr_lsc_egypt'
     ]
     for col in date_columns:
         if col in data_frame.columns:
-            data_frame[col] = pd.to_datetime(
-                data_frame[col],
-                errors='coerce'
-            ).dt.date  # Extract date component
+            data_frame[col] = date_parser.parse_series(data_frame[col], col)  # Extract date component
             logging.debug(f"Date field '{col}' processed.")
 
     # Replace NaN and Infinity with None
@@ -8,9 +8,20 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import QFile, QAbstractTableModel, Qt, QModelIndex, Signal
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtGui import QCursor
-import pandas as pd
 from mrl_detail_window import MRLDetailWindow
 
+SEARCH_VIEW = "combined_line_items_fulfillments_search_view"
+
+# Columns of the search view the results can be sorted on (header click); anything else is ignored
+SORTABLE_COLUMNS = (
+    'order_line_item_id', 'fulfillment_item_id', 'jcn', 'twcode', 'nomenclature', 'cog', 'fsc',
+    'niin', 'part_no', 'qty', 'ui', 'market_research_up', 'market_research_ep',
+    'availability_identifier', 'availability_event', 'request_date', 'rdd', 'pri', 'swlin',
+    'hull_or_shop', 'suggested_source', 'mfg_cage', 'apl', 'nha_equipment_system', 'nha_model',
+    'nha_serial', 'techmanual', 'dwg_pc', 'system_identifier_code', 'link_id'
+)
+DEFAULT_SORT_COLUMN = 'jcn'
+
 class SearchWindow(QMainWindow):
     window_closed = Signal()
     def __init__(self, db_manager):
@@ -46,9 +57,11 @@ class SearchWindow(QMainWindow):
             logging.debug("Signals connected in SearchWindow.")
 
             # Initialize variables
-            self.results_df = pd.DataFrame()
-            self.limit = 100  # Initial limit
-            self.offset = 0
+            self.limit = 100  # Page size
+            self.sort_column = DEFAULT_SORT_COLUMN
+            self.sort_ascending = True
+            self.last_key = None  # (sort value, order_line_item_id, fulfillment_item_id, link_id) of the last loaded row
+            self.estimated_total = 0
 
             # Set up the results table
             self.setup_results_table()
@@ -80,101 +93,177 @@ class SearchWindow(QMainWindow):
         logging.debug("Signals connected in SearchWindow.")
 
     def perform_search(self):
-        self.offset = 0  # Reset offset when performing a new search
+        self.last_key = None  # Start again from the first page
         self.apply_filter()
 
     def apply_filter(self):
         try:
-            self.results_df = pd.DataFrame()  # Clear previous results
-            self.ui.resultsTable.model().layoutChanged.emit()  # Refresh the table
+            self.model.clear()  # Clear previous results
             self.load_data()
         except Exception as e:
             logging.exception(f"Error in apply_filter: {e}")
             QMessageBox.critical(self, "Error", f"An error occurred during search:\n{str(e)}")
 
     def setup_results_table(self):
-        self.model = PandasTableModel(self.results_df)
+        self.model = RowTableModel()
         self.ui.resultsTable.setModel(self.model)
         self.ui.resultsTable.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.ui.resultsTable.setSelectionMode(QAbstractItemView.SingleSelection)
         self.ui.resultsTable.setAlternatingRowColors(True)
-        self.ui.resultsTable.setSortingEnabled(True)
+        # Sorting is done by the server over the whole result, not by the view over the loaded rows
+        self.ui.resultsTable.setSortingEnabled(False)
+        header = self.ui.resultsTable.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.sectionClicked.connect(self.sort_by_column)
+
+    def sort_by_column(self, section):
+        column = self.model.column_name(section)
+        if column not in SORTABLE_COLUMNS:
+            return
+        if column == self.sort_column:
+            self.sort_ascending = not self.sort_ascending
+        else:
+            self.sort_column = column
+            self.sort_ascending = True
+        self.ui.resultsTable.horizontalHeader().setSortIndicator(
+            section, Qt.AscendingOrder if self.sort_ascending else Qt.DescendingOrder
+        )
+        self.perform_search()
+
+    def build_filter(self):
+        """Returns the WHERE clause and parameters for the filter fields."""
+        conditions = []
+        params = {}
+
+        # Get filter values
+        filters = {
+            'jcn': self.ui.jcnEdit.text(),
+            'niin': self.ui.niinEdit.text(),
+            'part_no': self.ui.partNoEdit.text(),
+            'twcode': self.ui.twcodeEdit.text(),
+            'swlin': self.ui.swlinEdit.text(),
+            'nomenclature': self.ui.nomenclatureEdit.text(),
+            'availability_identifier': self.ui.availabilityIdentifierEdit.text(),
+        }
+
+        # Define data types
+        field_data_types = {
+            'jcn': 'text',
+            'niin': 'text',
+            'part_no': 'text',
+            'twcode': 'text',
+            'swlin': 'text',
+            'nomenclature': 'text',
+            'availability_identifier': 'integer',
+        }
+
+        # Build conditions for each field, supporting multiple tokens
+        for field, value in filters.items():
+            if value:
+                data_type = field_data_types.get(field, 'text')
+                tokens = value.replace('*', '%').split('%')
+                token_conditions = []
+                for idx, token in enumerate(tokens):
+                    if token:
+                        param_key = f"{field}_{idx}"
+                        if data_type == 'text':
+                            token_conditions.append(f"{field} ILIKE %({param_key})s")
+                            params[param_key] = f"%{token}%"
+                        elif data_type == 'integer':
+                            # For partial matching, cast integer field to text
+                            token_conditions.append(f"CAST({field} AS TEXT) ILIKE %({param_key})s")
+                            params[param_key] = f"%{token}%"
+                        else:
+                            # Handle other data types if necessary
+                            pass
+                if token_conditions:
+                    conditions.append(" AND ".join(token_conditions))
+
+        where_sql = "1=1"
+        if conditions:
+            where_sql += " AND " + " AND ".join(conditions)
+        return where_sql, params
+
+    def build_keyset(self, params):
+        """Returns the ORDER BY clause and the condition for the rows after self.last_key.
+
+        Rows are ordered on (sort column, order_line_item_id, fulfillment_item_id, link_id), all in the
+        sort direction with NULL sort values last, so the next page continues from the last
+        loaded row instead of skipping an OFFSET of rows.
+        """
+        column = self.sort_column
+        direction, comparison = ("ASC", ">") if self.sort_ascending else ("DESC", "<")
+        # Line items without fulfillments or report links have a NULL fulfillment_item_id or
+        # link_id; ids start at 1. link_id keeps rows unique when a line item has several links.
+        order_by = (f"{column} {direction} NULLS LAST, order_line_item_id {direction}, "
+                    f"COALESCE(fulfillment_item_id, 0) {direction}, COALESCE(link_id, 0) {direction}")
+        if self.last_key is None:
+            return order_by, "TRUE"
+
+        (last_value, params['last_line_item_id'], params['last_fulfillment_id'],
+         params['last_link_id']) = self.last_key
+        tiebreak = "order_line_item_id, COALESCE(fulfillment_item_id, 0), COALESCE(link_id, 0)"
+        if last_value is None:
+            keyset_sql = (f"{column} IS NULL AND ({tiebreak}) "
+                          f"{comparison} (%(last_line_item_id)s, %(last_fulfillment_id)s, %(last_link_id)s)")
+        else:
+            params['last_sort_value'] = last_value
+            keyset_sql = (f"({column} IS NULL OR ({column}, {tiebreak}) {comparison} "
+                          f"(%(last_sort_value)s, %(last_line_item_id)s, %(last_fulfillment_id)s, %(last_link_id)s))")
+        return order_by, keyset_sql
+
+    def estimate_count(self, cursor, where_sql, params):
+        """Planner estimate of the number of matching rows, without counting them."""
+        cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {SEARCH_VIEW} WHERE {where_sql}", params)
+        plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
 
     def load_data(self):
         try:
             self.ui.loadingIndicator.setVisible(True)
             QApplication.processEvents()
-            conditions = []
-            params = {}
-
-            # Get filter values
-            filters = {
-                'jcn': self.ui.jcnEdit.text(),
-                'niin': self.ui.niinEdit.text(),
-                'part_no': self.ui.partNoEdit.text(),
-                'twcode': self.ui.twcodeEdit.text(),
-                'swlin': self.ui.swlinEdit.text(),
-                'nomenclature': self.ui.nomenclatureEdit.text(),
-                'availability_identifier': self.ui.availabilityIdentifierEdit.text(),
-            }
-
-            # Define data types
-            field_data_types = {
-                'jcn': 'text',
-                'niin': 'text',
-                'part_no': 'text',
-                'twcode': 'text',
-                'swlin': 'text',
-                'nomenclature': 'text',
-                'availability_identifier': 'integer',
-            }
-
-            # Build conditions for each field, supporting multiple tokens
-            for field, value in filters.items():
-                if value:
-                    data_type = field_data_types.get(field, 'text')
-                    tokens = value.replace('*', '%').split('%')
-                    token_conditions = []
-                    for idx, token in enumerate(tokens):
-                        if token:
-                            param_key = f"{field}_{idx}"
-                            if data_type == 'text':
-                                token_conditions.append(f"{field} ILIKE %({param_key})s")
-                                params[param_key] = f"%{token}%"
-                            elif data_type == 'integer':
-                                # For partial matching, cast integer field to text
-                                token_conditions.append(f"CAST({field} AS TEXT) ILIKE %({param_key})s")
-                                params[param_key] = f"%{token}%"
-                            else:
-                                # Handle other data types if necessary
-                                pass
-                    if token_conditions:
-                        conditions.append(" AND ".join(token_conditions))
-
-            # Build the SQL query
-            sql_query = "SELECT * FROM combined_line_items_fulfillments_search_view WHERE 1=1"
-            if conditions:
-                sql_query += " AND " + " AND ".join(conditions)
-            sql_query += f" ORDER BY jcn LIMIT {self.limit} OFFSET {self.offset}"
+            where_sql, params = self.build_filter()
+            order_by, keyset_sql = self.build_keyset(params)
+
+            # Build the SQL query; one extra row tells whether there is another page
+            sql_query = (f"SELECT * FROM {SEARCH_VIEW} WHERE {where_sql} AND {keyset_sql} "
+                         f"ORDER BY {order_by} LIMIT {self.limit + 1}")
 
             logging.debug(f"Executing search query: {sql_query} with params: {params}")
 
             # Execute the query
             with self.db_manager.connection.cursor() as cursor:
+                if self.last_key is None:
+                    self.estimated_total = self.estimate_count(cursor, where_sql, params)
                 cursor.execute(sql_query, params)
                 columns = [desc[0] for desc in cursor.description]
                 data = cursor.fetchall()
-                df = pd.DataFrame(data, columns=columns)
 
-            # Append new data
-            self.results_df = pd.concat([self.results_df, df], ignore_index=True)
-            self.model.update_data(self.results_df)
+            has_more = len(data) > self.limit
+            data = data[:self.limit]
+
+            # Append new rows
+            self.model.append_rows(columns, data)
+            if data:
+                last_row = dict(zip(columns, data[-1]))
+                self.last_key = (
+                    last_row[self.sort_column],
+                    last_row['order_line_item_id'],
+                    last_row['fulfillment_item_id'] or 0,
+                    last_row['link_id'] or 0,
+                )
 
             # Update the result count label
-            total_records = len(self.results_df)
-            self.ui.resultCountLabel.setText(f"Showing {total_records} records")
+            total_records = self.model.rowCount()
+            if has_more:
+                self.ui.resultCountLabel.setText(
+                    f"Showing {total_records} of ~{max(self.estimated_total, total_records + 1)} records"
+                )
+            else:
+                self.ui.resultCountLabel.setText(f"Showing {total_records} of {total_records} records")
+            self.ui.loadMoreButton.setEnabled(has_more)
 
-            self.offset += self.limit  # Update offset for next load
             self.ui.loadingIndicator.setVisible(False)
         except Exception as e:
             self.ui.loadingIndicator.setVisible(False)
@@ -194,15 +283,14 @@ class SearchWindow(QMainWindow):
         self.ui.nomenclatureEdit.clear()
         self.ui.availabilityIdentifierEdit.clear()
         # Clear results
-        self.results_df = pd.DataFrame()
-        self.model.update_data(self.results_df)
-        self.ui.resultCountLabel.setText("Showing 0 records")
-        self.offset = 0
+        self.model.clear()
+        self.ui.resultCountLabel.setText("Showing 0 of 0 records")
+        self.last_key = None
 
     def open_mrl_detail(self, index):
         try:
             row = index.row()
-            record = self.results_df.iloc[row]
+            record = self.model.row_record(row)
             order_line_item_id = int(record['order_line_item_id'])  # Convert to Python int
             # Open MRL Detail Window
             mrl_detail_window = MRLDetailWindow(self.db_manager, order_line_item_id, parent=None)
@@ -224,38 +312,60 @@ class SearchWindow(QMainWindow):
         self.window_closed.emit()
         super(SearchWindow, self).closeEvent(event)
 
-class PandasTableModel(QAbstractTableModel):
-    def __init__(self, df=pd.DataFrame(), parent=None):
-        super(PandasTableModel, self).__init__(parent)
-        self._df = df
+class RowTableModel(QAbstractTableModel):
+    """Table model over the fetched rows; pages are appended in place instead of rebuilding the table."""
 
-    def update_data(self, df):
+    def __init__(self, parent=None):
+        super(RowTableModel, self).__init__(parent)
+        self._columns = []
+        self._rows = []
+
+    def clear(self):
         self.beginResetModel()
-        self._df = df
+        self._columns = []
+        self._rows = []
         self.endResetModel()
 
+    def append_rows(self, columns, rows):
+        if columns != self._columns:
+            self.beginResetModel()
+            self._columns = list(columns)
+            self._rows = []
+            self.endResetModel()
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def column_name(self, section):
+        if 0 <= section < len(self._columns):
+            return self._columns[section]
+        return None
+
+    def row_record(self, row):
+        return dict(zip(self._columns, self._rows[row]))
+
     def rowCount(self, parent=QModelIndex()):
-        return len(self._df)
+        return len(self._rows)
 
     def columnCount(self, parent=QModelIndex()):
-        if not self._df.empty:
-            return len(self._df.columns)
-        return 0
+        return len(self._columns)
 
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
-            value = self._df.iloc[index.row(), index.column()]
+            value = self._rows[index.row()][index.column()]
             if role == Qt.DisplayRole:
-                return str(value)
+                return "" if value is None else str(value)
         return None
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
-        if self._df.empty:
+        if not self._columns:
             return None
         if role == Qt.DisplayRole:
             if orientation == Qt.Horizontal:
-                return self._df.columns[section]
+                return self._columns[section]
             else:
                 return section
         return None
-
@@ -32,4 +32,6 @@ CREATE INDEX idx_import_error_log_record_data ON import_error_log USING GIN (rec
 -- Additional index for faster queries
 CREATE INDEX idx_staged_egypt_weekly_data_report ON staged_egypt_weekly_data(report_name, report_date);
 
-
+-- Upsert key of import_staged_egypt_weekly_sheet, with a missing system_identifier_code treated as a value
+CREATE UNIQUE INDEX IF NOT EXISTS idx_staged_egypt_weekly_data_record_key
+ON staged_egypt_weekly_data (report_name, report_date, sheet_name, original_line, COALESCE(system_identifier_code, ''));
@@ -0,0 +1,142 @@
+-- Server-side export of one preprocessed sheet from ReportsDB into staged_egypt_weekly_data.
+-- Rows are read through dblink (reportsdb_server, see 05 utilities/100_link_databases.sql) and
+-- upserted on the staged record key (idx_staged_egypt_weekly_data_record_key, see 02 schema), so
+-- exporting a sheet again updates its rows instead of duplicating them. Matching state (mrl_matched, fulfillment_matched, processing_*) is kept.
+-- If a sheet was preprocessed from more than one upload version, the latest row per key wins.
+--
+-- Usage: SELECT import_staged_egypt_weekly_sheet('Weekly Report', '2024-06-03', 'MRL');
+
+CREATE OR REPLACE FUNCTION import_staged_egypt_weekly_sheet(
+    p_report_name VARCHAR,
+    p_report_date DATE,
+    p_sheet_name VARCHAR
+)
+RETURNS INT AS $$
+DECLARE
+    v_count INT;
+BEGIN
+    INSERT INTO staged_egypt_weekly_data (
+        preprocessed_id, raw_data_id, report_name, report_date, sheet_name, original_line,
+        system_identifier_code, jcn, twcode, nomenclature, cog, fsc,
+        niin, part_no, qty, ui, market_research_up, market_research_ep,
+        availability_identifier, request_date, rdd, pri, swlin, hull_or_shop,
+        suggested_source, mfg_cage, apl, nha_equipment_system, nha_model, nha_serial,
+        techmanual, dwg_pc, requestor_remarks, shipdoc_tcn, v2x_ship_no, booking,
+        vessel, container, carrier, sail_date, edd_to_ches, edd_egypt,
+        rcd_v2x_date, lot_id, triwall, lsc_on_hand_date, arr_lsc_egypt, milstrip_req_no,
+        additional_data, overall_quality_score, flags, data_integrity_score, consistency_score, completeness_score,
+        check_details, mapped_fields
+    )
+    SELECT
+        t.preprocessed_id, t.raw_data_id, t.report_name, t.report_date, t.sheet_name,
+        t.original_line, t.system_identifier_code, t.jcn, t.twcode, t.nomenclature,
+        t.cog, t.fsc, t.niin, t.part_no, t.qty,
+        t.ui, t.market_research_up::MONEY, t.market_research_ep::MONEY, t.availability_identifier, t.request_date,
+        t.rdd, t.pri, t.swlin, t.hull_or_shop, t.suggested_source,
+        t.mfg_cage, t.apl, t.nha_equipment_system, t.nha_model, t.nha_serial,
+        t.techmanual, t.dwg_pc, t.requestor_remarks, t.shipdoc_tcn, t.v2x_ship_no,
+        t.booking, t.vessel, t.container, t.carrier, t.sail_date,
+        t.edd_to_ches, t.edd_egypt, t.rcd_v2x_date, t.lot_id, t.triwall,
+        t.lsc_on_hand_date, t.arr_lsc_egypt, t.milstrip_req_no, t.additional_data, t.overall_quality_score,
+        t.flags, t.data_integrity_score, t.consistency_score, t.completeness_score, t.check_details,
+        t.mapped_fields
+    FROM dblink('reportsdb_server', format($remote$
+            SELECT DISTINCT ON (p.original_line, COALESCE(p.system_identifier_code, ''))
+                   p.preprocessed_id, p.raw_data_id, p.report_name, p.report_date,
+                   p.sheet_name, p.original_line, p.system_identifier_code, p.jcn,
+                   p.twcode, p.nomenclature, p.cog, p.fsc,
+                   p.niin, p.part_no, p.qty, p.ui,
+                   p.market_research_up::NUMERIC, p.market_research_ep::NUMERIC, p.availability_identifier, p.request_date,
+                   p.rdd, p.pri, p.swlin, p.hull_or_shop,
+                   p.suggested_source, p.mfg_cage, p.apl, p.nha_equipment_system,
+                   p.nha_model, p.nha_serial, p.techmanual, p.dwg_pc,
+                   p.requestor_remarks, p.shipdoc_tcn, p.v2x_ship_no, p.booking,
+                   p.vessel, p.container, p.carrier, p.sail_date,
+                   p.edd_to_ches, p.edd_egypt, p.rcd_v2x_date, p.lot_id,
+                   p.triwall, p.lsc_on_hand_date, p.arr_lsc_egypt, p.milstrip_req_no,
+                   p.additional_data, q.overall_quality_score, p.flags, q.data_integrity_score,
+                   q.consistency_score, q.completeness_score, q.check_details, p.mapped_fields
+            FROM preprocessed_egypt_weekly_data p
+            LEFT JOIN quality_checked_records q ON p.preprocessed_id = q.preprocessed_id
+            WHERE p.report_name = %L AND p.report_date = %L AND p.sheet_name = %L
+            ORDER BY p.original_line, COALESCE(p.system_identifier_code, ''), p.preprocessed_id DESC
+        $remote$, p_report_name, p_report_date, p_sheet_name)) AS t(
+            preprocessed_id INT, raw_data_id INT, report_name VARCHAR(255),
+            report_date DATE, sheet_name VARCHAR(255), original_line INT,
+            system_identifier_code VARCHAR(50), jcn VARCHAR(50), twcode VARCHAR(50),
+            nomenclature TEXT, cog VARCHAR(10), fsc VARCHAR(10),
+            niin VARCHAR(20), part_no VARCHAR(50), qty INT,
+            ui VARCHAR(10), market_research_up NUMERIC, market_research_ep NUMERIC,
+            availability_identifier INT, request_date DATE, rdd DATE,
+            pri VARCHAR(10), swlin VARCHAR(20), hull_or_shop VARCHAR(20),
+            suggested_source TEXT, mfg_cage VARCHAR(20), apl VARCHAR(50),
+            nha_equipment_system TEXT, nha_model TEXT, nha_serial TEXT,
+            techmanual TEXT, dwg_pc TEXT, requestor_remarks TEXT,
+            shipdoc_tcn VARCHAR(30), v2x_ship_no VARCHAR(20), booking VARCHAR(20),
+            vessel VARCHAR(30), container VARCHAR(25), carrier VARCHAR(50),
+            sail_date DATE, edd_to_ches DATE, edd_egypt DATE,
+            rcd_v2x_date DATE, lot_id VARCHAR(30), triwall VARCHAR(30),
+            lsc_on_hand_date DATE, arr_lsc_egypt DATE, milstrip_req_no VARCHAR(25),
+            additional_data JSONB, overall_quality_score DECIMAL(5,2), flags JSONB,
+            data_integrity_score DECIMAL(5,2), consistency_score DECIMAL(5,2), completeness_score DECIMAL(5,2),
+            check_details JSONB, mapped_fields TEXT[]
+        )
+    ON CONFLICT (report_name, report_date, sheet_name, original_line, COALESCE(system_identifier_code, ''))
+    DO UPDATE SET
+        preprocessed_id = EXCLUDED.preprocessed_id,
+        raw_data_id = EXCLUDED.raw_data_id,
+        jcn = EXCLUDED.jcn,
+        twcode = EXCLUDED.twcode,
+        nomenclature = EXCLUDED.nomenclature,
+        cog = EXCLUDED.cog,
+        fsc = EXCLUDED.fsc,
+        niin = EXCLUDED.niin,
+        part_no = EXCLUDED.part_no,
+        qty = EXCLUDED.qty,
+        ui = EXCLUDED.ui,
+        market_research_up = EXCLUDED.market_research_up,
+        market_research_ep = EXCLUDED.market_research_ep,
+        availability_identifier = EXCLUDED.availability_identifier,
+        request_date = EXCLUDED.request_date,
+        rdd = EXCLUDED.rdd,
+        pri = EXCLUDED.pri,
+        swlin = EXCLUDED.swlin,
+        hull_or_shop = EXCLUDED.hull_or_shop,
+        suggested_source = EXCLUDED.suggested_source,
+        mfg_cage = EXCLUDED.mfg_cage,
+        apl = EXCLUDED.apl,
+        nha_equipment_system = EXCLUDED.nha_equipment_system,
+        nha_model = EXCLUDED.nha_model,
+        nha_serial = EXCLUDED.nha_serial,
+        techmanual = EXCLUDED.techmanual,
+        dwg_pc = EXCLUDED.dwg_pc,
+        requestor_remarks = EXCLUDED.requestor_remarks,
+        shipdoc_tcn = EXCLUDED.shipdoc_tcn,
+        v2x_ship_no = EXCLUDED.v2x_ship_no,
+        booking = EXCLUDED.booking,
+        vessel = EXCLUDED.vessel,
+        container = EXCLUDED.container,
+        carrier = EXCLUDED.carrier,
+        sail_date = EXCLUDED.sail_date,
+        edd_to_ches = EXCLUDED.edd_to_ches,
+        edd_egypt = EXCLUDED.edd_egypt,
+        rcd_v2x_date = EXCLUDED.rcd_v2x_date,
+        lot_id = EXCLUDED.lot_id,
+        triwall = EXCLUDED.triwall,
+        lsc_on_hand_date = EXCLUDED.lsc_on_hand_date,
+        arr_lsc_egypt = EXCLUDED.arr_lsc_egypt,
+        milstrip_req_no = EXCLUDED.milstrip_req_no,
+        additional_data = EXCLUDED.additional_data,
+        overall_quality_score = EXCLUDED.overall_quality_score,
+        flags = EXCLUDED.flags,
+        data_integrity_score = EXCLUDED.data_integrity_score,
+        consistency_score = EXCLUDED.consistency_score,
+        completeness_score = EXCLUDED.completeness_score,
+        check_details = EXCLUDED.check_details,
+        mapped_fields = EXCLUDED.mapped_fields,
+        import_timestamp = CURRENT_TIMESTAMP;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
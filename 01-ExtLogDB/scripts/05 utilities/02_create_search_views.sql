@@ -28,7 +28,9 @@ SELECT
     m.nha_serial,
     m.techmanual,
     m.dwg_pc,
-    r.system_identifier_code
+    r.system_identifier_code,
+    -- Last, so CREATE OR REPLACE can add it; makes each row unique for keyset paging
+    rr.link_id
 FROM
     MRL_line_items m
 LEFT JOIN